@@ -1,40 +1,52 @@
+import os
+from functools import lru_cache
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer, CountVectorizer
-from sklearn.decomposition import NMF
-from sklearn.decomposition import LatentDirichletAllocation
-import nltk
-import guidedlda
-from gensim import corpora
-from sklearn.metrics import normalized_mutual_info_score
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from top2vec import Top2Vec
-nltk.download('punkt')
-nltk.download('punkt_tab')
-nltk.download('stopwords')
-from corextopic import corextopic as ct
 from OurAlgorithm import *
+from coherence import build_cooccurrence_index, topic_coherence
 from collections import defaultdict, Counter
 import argparse
 
+# scikit-learn and the baseline libraries (corextopic, guidedlda, top2vec) are imported by
+# the functions that fit them, so importing this module stays cheap
+
+# NLTK resources live in a local cache and are only downloaded when missing from it
+NLTK_DATA_DIR = os.environ.get("NLTK_DATA", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+NLTK_RESOURCES = {"punkt": "tokenizers/punkt", "punkt_tab": "tokenizers/punkt_tab", "stopwords": "corpora/stopwords"}
+
+
+@lru_cache(maxsize=None)
+def nltk_preprocessing(language='finnish'):
+    """Resolves the NLTK resources once, returns (word_tokenize, stop_words)."""
+    import nltk
+
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    for package, resource in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    return word_tokenize, frozenset(stopwords.words(language))
+
 
 def preprocess_text(text):
+    word_tokenize, stop_words = nltk_preprocessing()
     tokens = word_tokenize(text.lower())
-    stop_words = set(stopwords.words('finnish'))
     tokens = [word for word in tokens if word.isalpha() and word not in stop_words]
     return tokens
 
-data = pd.read_csv('./synthetic-data.csv')
-documents = data['Sentence'].astype(str)
-true_labels = data['Label'].tolist()  # If available
 
-processed_docs = documents.apply(preprocess_text)
-dictionary = corpora.Dictionary(processed_docs)
-corpus = [dictionary.doc2bow(doc) for doc in processed_docs]
-documents = processed_docs.apply(lambda x: ' '.join(x))
-tfidf_vectorizer = TfidfVectorizer()
-tfidf_matrix = tfidf_vectorizer.fit_transform(documents)
-tfidf_feature_names = tfidf_vectorizer.get_feature_names_out()
+def load_documents(data_path):
+    """Preprocessed documents of data_path, and their labels."""
+    data = pd.read_csv(data_path)
+    documents = data['Sentence'].astype(str)
+    true_labels = data['Label'].tolist()  # If available
+
+    processed_docs = documents.apply(preprocess_text)
+    documents = processed_docs.apply(lambda x: ' '.join(x))
+    return documents, true_labels
 
 
 seed_words =[
@@ -240,60 +252,85 @@ seed_word_groups= [seed_words, seed_words, seed_words, seed_words, seed_words, s
 
 
 
-#initialize Our Algorithm
-seed_indices = [i for i, word in enumerate(tfidf_feature_names) if word in set(seed_words)]
-non_seed_indices = [i for i in range(len(tfidf_feature_names)) if i not in seed_indices]
-print("number of seed words in vocab: %d" % len(seed_indices))
-n_topics=15
-W_max=1e-9
-theta_min=0.4
-MH_indices=[0, 1, 2, 3, 4, 5, 6]
-W, H = train(tfidf_matrix, n_topics, MH_indices, W_max, non_seed_indices, seed_indices, theta_min, max_iter=40)
+def fit_our_model(documents, n_topics):
+    """Returns (tfidf_matrix, tfidf_feature_names, W, H) of our algorithm."""
+    from vocabulary import build_vocabulary
+
+    tfidf_matrix, tfidf_vectorizer, seed_indices, non_seed_indices, missing_seed_words = build_vocabulary(documents, seed_words)
+    tfidf_feature_names = tfidf_vectorizer.get_feature_names_out()
+    if missing_seed_words:
+        print("seed words missing from the corpus: %s" % ', '.join(missing_seed_words))
+    print("number of seed words in vocab: %d" % len(seed_indices))
+    W_max=1e-9
+    theta_min=0.4
+    MH_indices=[0, 1, 2, 3, 4, 5, 6]
+    W, H, kl_losses = train(tfidf_matrix, n_topics, MH_indices, W_max, non_seed_indices, seed_indices, theta_min, max_iter=40)
+    return tfidf_matrix, tfidf_feature_names, W, H
 
 
+def fit_corex(tfidf_matrix, tfidf_feature_names, n_topics):
+    from corextopic import corextopic as ct
 
+    anchors = [[a for a in topic if a in tfidf_feature_names] for topic in seed_word_groups]
+    corexi_model = ct.Corex(n_hidden=n_topics, seed=42)
+    return corexi_model.fit(tfidf_matrix, words=tfidf_feature_names, anchors=anchors, anchor_strength= 80)
 
 
-# Initialize Corex model
-anchors = [[a for a in topic if a in tfidf_feature_names] for topic in seed_word_groups]
-corexi_model = ct.Corex(n_hidden=n_topics, seed=42)
-corex_model = corexi_model.fit(tfidf_matrix, words=tfidf_feature_names, anchors=anchors, anchor_strength= 80)
+def fit_nmf(tfidf_matrix, n_topics):
+    from sklearn.decomposition import NMF
 
+    nmf_model = NMF(n_components=n_topics, random_state=42)
+    nmf_model.fit(tfidf_matrix)
+    return nmf_model
 
 
-# Initialize NMF model
-nmf_model = NMF(n_components=n_topics, random_state=42)
-nmf_model.fit(tfidf_matrix)
-nmf_topics = nmf_model.components_
+def fit_lda(tfidf_matrix, n_topics):
+    from sklearn.decomposition import LatentDirichletAllocation
 
+    lda_model = LatentDirichletAllocation(n_components=n_topics, random_state=42)
+    lda_model.fit(tfidf_matrix)
+    return lda_model
 
 
-# Initialize LDA model
-lda_model = LatentDirichletAllocation(n_components=n_topics, random_state=42)
-lda_model.fit(tfidf_matrix)
-lda_topics = lda_model.components_
+def fit_guided_lda(documents, n_topics):
+    """Returns (guided_model, bow_matrix, feature_names) of Guided LDA on word counts."""
+    import guidedlda
+    from sklearn.feature_extraction.text import CountVectorizer
 
+    vectorizer = CountVectorizer()
+    bow_matrix = vectorizer.fit_transform(documents)
+    tfidf_feature_names_guided = vectorizer.get_feature_names_out()
+    guided_model = guidedlda.GuidedLDA(n_topics=n_topics, n_iter=100, random_state=42, refresh=20)
+    word2id = {word: i for i, word in enumerate(tfidf_feature_names_guided)}
+    seed_topics = {}
+    for t_id, st in enumerate(seed_word_groups):
+        for word in st:
+            if word in word2id:
+                seed_topics[word2id[word]] = t_id
+    guided_model.fit(bow_matrix, seed_topics=seed_topics, seed_confidence=0.4)
+    return guided_model, bow_matrix, tfidf_feature_names_guided
 
-# Initialize Guided_LDA model
-vectorizer = CountVectorizer()
-bow_matrix = vectorizer.fit_transform(documents)
-tfidf_feature_names_guided = vectorizer.get_feature_names_out()
 
-guided_model = guidedlda.GuidedLDA(n_topics=n_topics, n_iter=100, random_state=42, refresh=20)
-word2id = {word: i for i, word in enumerate(tfidf_feature_names_guided)}
-seed_topics = {}
-for t_id, st in enumerate(seed_word_groups):
-    for word in st:
-        if word in word2id:
-            seed_topics[word2id[word]] = t_id
-guided_model.fit(bow_matrix, seed_topics=seed_topics, seed_confidence=0.4)
-n_top_words = 10
-topic_word = guided_model.topic_word_
-topic_words_list = []
-documents_list = documents.tolist()
-top2vec_model = Top2Vec(documents=documents_list, speed="learn", workers=16)
-topic_wordss, word_scores, topic_nums = top2vec_model.get_topics()
+def fit_top2vec(documents):
+    from top2vec import Top2Vec  # pulls in TensorFlow
 
+    return Top2Vec(documents=documents.tolist(), speed="learn", workers=16)
+
+
+def top2vec_labels(top2vec_model, topic_nums, n_documents):
+    """Topic label per document, from each topic's document search."""
+    predicted_labels = np.zeros(n_documents)
+    num_topics = len(topic_nums)
+    for topic_num in range(num_topics):
+        num_docs_for_topic = top2vec_model.topic_sizes[topic_num]
+        num_docs_to_retrieve = min(n_documents, num_docs_for_topic)
+        dociiii, document_scores, document_ids = top2vec_model.search_documents_by_topic(
+            topic_num=topic_num,
+            num_docs=num_docs_to_retrieve
+        )
+        for doc_id in document_ids:
+            predicted_labels[doc_id] = topic_num
+    return np.array(predicted_labels)
 
 
 def get_topicss(H, top_words, id2word):
@@ -307,13 +344,6 @@ def get_topicss(H, top_words, id2word):
     return topic_list
 
 
-result = {}
-result["topic-word-matrix"] = H
-id2word = {i: word for i, word in enumerate(tfidf_feature_names)}
-if n_top_words > 0:
-    result["topics"] = get_topicss(H, n_top_words, id2word)
-
-
 def get_topics(H, top_words, id2word):
     topic_list = []
     for topic_idx, topic in enumerate(H):
@@ -343,89 +373,6 @@ def display_topics_corex(model, no_top_words):
     return topics
 
 
-print("\nGuided LDA Topics:")
-for i, topic_dist in enumerate(topic_word):
-    top_word_ids = np.argsort(topic_dist)[-n_top_words:][::-1]  # descending order
-    top_words = [tfidf_feature_names_guided[word_id] for word_id in top_word_ids]
-    topic_words_list.append(top_words)  # Store words for each topic
-    print('Topic {}: {}'.format(i, ', '.join(top_words)))
-print("\nTOP2VEC model Topics: ")
-for i, topic in enumerate(topic_nums):
-    print(f"Topic {topic}: {', '.join(topic_wordss[i])}")
-print("\nNMF Topics:")
-nmf_topic_words = display_topics(nmf_topics, tfidf_feature_names, n_top_words)
-print("\nLDA Topics:")
-lda_topic_words = display_topics(lda_topics, tfidf_feature_names, n_top_words)
-print("\nCorex Topics:")
-corex_topic_words= display_topics_corex(corex_model, n_top_words)
-print("\nOur Model Topics:")
-own_topic_words = get_topics(H, n_top_words, id2word=id2word)
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-# NMF Topic Assignments
-nmf_doc_topics = nmf_model.transform(tfidf_matrix)
-nmf_doc_labels = np.argmax(nmf_doc_topics, axis=1)
-
-
-
-
-# LDA Topic Assignments
-lda_doc_topics = lda_model.transform(tfidf_matrix)
-lda_doc_labels = np.argmax(lda_doc_topics, axis=1)
-
-
-
-
-# Corex Topic Assignments
-cor_doc_topics = corex_model.transform(tfidf_matrix)
-cor_doc_labels = np.argmax(cor_doc_topics, axis=1)
-
-
-
-
-# Our Model Topic Assignments
-own_doc_labels = np.argmax(W, axis=1)
-
-
-
-# Guided LDA Topic Assignments
-guided_lda_doc_topics = guided_model.transform(bow_matrix)
-guided_lda_doc_labels = np.argmax(guided_lda_doc_topics, axis=1)
-
-
-
-
-#top2vec label prediction
-predicted_labels = np.zeros(len(true_labels))
-num_topics = len(topic_nums)
-for topic_num in range(num_topics):
-    num_docs_for_topic = top2vec_model.topic_sizes[topic_num]
-    num_docs_to_retrieve = min(len(true_labels), num_docs_for_topic)
-    dociiii, document_scores, document_ids = top2vec_model.search_documents_by_topic(
-        topic_num=topic_num,
-        num_docs=num_docs_to_retrieve
-    )
-    for doc_id in document_ids:
-        predicted_labels[doc_id] = topic_num
-predicted_labels = np.array(predicted_labels)
-
-
-
-
-
 # this function calculate purity by grouping predicted clusters and then checking how
 # pure each cluster is by finding the most frequent true label within that cluster.
 # This is more aligned with standard purity metrics in clustering, where we look at clusters' "purity.
@@ -486,11 +433,75 @@ def parse_args():
     parser = argparse.ArgumentParser(description="Evaluation of Topic Models")
 
     # Data paths
-    parser.add_argument('--data_path', type=str, required=True, help="Path to the data CSV file containing true and predicted labels")
+    parser.add_argument('--data_path', type=str, default='./synthetic-data.csv', help="Path to the data CSV file containing the documents and true labels")
 
     return parser.parse_args()
 
 def main():
+    args = parse_args()
+    from sklearn.metrics import normalized_mutual_info_score
+
+    documents, true_labels = load_documents(args.data_path)
+    n_topics = 15
+    n_top_words = 10
+    tfidf_matrix, tfidf_feature_names, W, H = fit_our_model(documents, n_topics)
+    corex_model = fit_corex(tfidf_matrix, tfidf_feature_names, n_topics)
+    nmf_model = fit_nmf(tfidf_matrix, n_topics)
+    nmf_topics = nmf_model.components_
+    lda_model = fit_lda(tfidf_matrix, n_topics)
+    lda_topics = lda_model.components_
+    guided_model, bow_matrix, tfidf_feature_names_guided = fit_guided_lda(documents, n_topics)
+    topic_word = guided_model.topic_word_
+    topic_words_list = []
+    top2vec_model = fit_top2vec(documents)
+    topic_wordss, word_scores, topic_nums = top2vec_model.get_topics()
+
+    result = {}
+    result["topic-word-matrix"] = H
+    id2word = {i: word for i, word in enumerate(tfidf_feature_names)}
+    if n_top_words > 0:
+        result["topics"] = get_topicss(H, n_top_words, id2word)
+
+    print("\nGuided LDA Topics:")
+    for i, topic_dist in enumerate(topic_word):
+        top_word_ids = np.argsort(topic_dist)[-n_top_words:][::-1]  # descending order
+        top_words = [tfidf_feature_names_guided[word_id] for word_id in top_word_ids]
+        topic_words_list.append(top_words)  # Store words for each topic
+        print('Topic {}: {}'.format(i, ', '.join(top_words)))
+    print("\nTOP2VEC model Topics: ")
+    for i, topic in enumerate(topic_nums):
+        print(f"Topic {topic}: {', '.join(topic_wordss[i])}")
+    print("\nNMF Topics:")
+    nmf_topic_words = display_topics(nmf_topics, tfidf_feature_names, n_top_words)
+    print("\nLDA Topics:")
+    lda_topic_words = display_topics(lda_topics, tfidf_feature_names, n_top_words)
+    print("\nCorex Topics:")
+    corex_topic_words= display_topics_corex(corex_model, n_top_words)
+    print("\nOur Model Topics:")
+    own_topic_words = get_topics(H, n_top_words, id2word=id2word)
+
+    # NMF Topic Assignments
+    nmf_doc_topics = nmf_model.transform(tfidf_matrix)
+    nmf_doc_labels = np.argmax(nmf_doc_topics, axis=1)
+
+    # LDA Topic Assignments
+    lda_doc_topics = lda_model.transform(tfidf_matrix)
+    lda_doc_labels = np.argmax(lda_doc_topics, axis=1)
+
+    # Corex Topic Assignments
+    cor_doc_topics = corex_model.transform(tfidf_matrix)
+    cor_doc_labels = np.argmax(cor_doc_topics, axis=1)
+
+    # Our Model Topic Assignments
+    own_doc_labels = np.argmax(W, axis=1)
+
+    # Guided LDA Topic Assignments
+    guided_lda_doc_topics = guided_model.transform(bow_matrix)
+    guided_lda_doc_labels = np.argmax(guided_lda_doc_topics, axis=1)
+
+    #top2vec label prediction
+    predicted_labels = top2vec_labels(top2vec_model, topic_nums, len(true_labels))
+
     # Convert to a pandas DataFrame for easier handling
     y_true = np.array(true_labels)
     unique_labels = np.unique(y_true[y_true != '-1'])
@@ -526,6 +537,22 @@ def main():
     print(f"Own Model NMI Score: {own_nmi:.4f}")
     print(f"GUIDED_LDA NMI Score: {guided_lda_nmi:.4f}")
     print(f"Top2Vec NMI Score: {top2vec_nmi_score:.4f}")
+    print("\n")
+
+    # Topic coherence, all models scored against one document co-occurrence index
+    cooccurrence_index = build_cooccurrence_index(tfidf_matrix, tfidf_feature_names)
+    model_topics = {
+        "nmf": nmf_topic_words,
+        "lda": lda_topic_words,
+        "corex": corex_topic_words,
+        "our model": own_topic_words,
+        "guided_lda": topic_words_list,
+        "top2vec": [list(words[:n_top_words]) for words in topic_wordss],
+    }
+    for measure in ("npmi", "umass"):
+        coherence = topic_coherence(cooccurrence_index, model_topics, top_n=n_top_words, measure=measure)
+        for name, scores in coherence.items():
+            print(f"{measure.upper()} coherence for {name}: {np.nanmean(scores):.4f}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,8 @@
 import scipy.sparse as sp
-import time
+import json
+import re
+import unicodedata
+from collections.abc import Mapping
 from numpy.linalg import norm
 import numpy as np
 from scipy.sparse import csr_matrix
@@ -9,7 +12,6 @@ def write_log_file (messagetowrite):
     f= open ("./log.txt", "a")
     f.write(messagetowrite)
     f.close()
-start_total = time.time()
 EPSILON = np.finfo(np.float32).eps
 def normalize_matrix(matrix):
     total_sum = matrix.sum()
@@ -53,18 +55,44 @@ def safe_sparse_dot(a, b, *, dense_output=False):
         return ret.toarray()
     return ret
 
-def _special_sparse_dot(W, H, X):
-    """Computes np.dot(W, H), only where X is non zero."""
+def _canonical_csr(V):
+    """V as CSR with sorted indices and no duplicate entries; a copy only when V is not already."""
+    V = csr_matrix(V)
+    if not V.has_canonical_format:
+        V = V.copy()
+        V.sum_duplicates()
+    return V
+
+
+def _special_sparse_dot(W, H, X, batch_size=None):
+    """Computes np.dot(W, H), only where X is non zero.
+
+    For a CSR X the result has X's structure, so its data lines up with X.data whether or
+    not X's indices are sorted. batch_size nonzeros are computed at a time (default
+    max(k, nnz // k)), each batch allocating three batch_size x k arrays."""
     if sp.issparse(X):
-        ii, jj = X.nonzero()
-        n_vals = ii.shape[0]
-        dot_vals = np.empty(n_vals)
         n_components = W.shape[1]
-
-        batch_size = max(n_components, n_vals // n_components)
+        # a sparse (pruned) H is gathered by columns, one batch at a time
+        H_T = H.T.tocsr() if sp.issparse(H) else H.T
+        if sp.isspmatrix_csr(X):
+            # rows are found per batch, no nonzero() or COO round trip
+            n_vals = X.nnz
+            ii, jj = None, X.indices
+        else:
+            ii, jj = X.nonzero()
+            n_vals = ii.shape[0]
+        dot_vals = np.empty(n_vals)
+        if batch_size is None:
+            batch_size = max(n_components, n_vals // n_components)
         for start in range(0, n_vals, batch_size):
             batch = slice(start, start + batch_size)
-            dot_vals[batch] = np.multiply(W[ii[batch], :], H.T[jj[batch], :]).sum(axis=1)
+            H_batch = H_T[jj[batch], :]
+            if sp.issparse(H_batch):
+                H_batch = H_batch.toarray()
+            rows = ii[batch] if ii is not None else np.searchsorted(X.indptr, np.arange(start, min(start + batch_size, n_vals)), side='right') - 1
+            dot_vals[batch] = np.multiply(W[rows, :], H_batch).sum(axis=1)
+        if ii is None:
+            return csr_matrix((dot_vals, X.indices, X.indptr), shape=X.shape)
         WH = sp.coo_matrix((dot_vals, (ii, jj)), shape=X.shape)
         return WH.tocsr()
     else:
@@ -72,34 +100,127 @@ def _special_sparse_dot(W, H, X):
 
 def _special_sparse_div(V, WH):
     """Computes np.dot(W, H), only where X is non zero."""
+    if (sp.isspmatrix_csr(V) and sp.isspmatrix_csr(WH) and WH.nnz == V.nnz
+            and np.array_equal(WH.indptr, V.indptr) and np.array_equal(WH.indices, V.indices)):
+        # WH from _special_sparse_dot on V shares its structure
+        WH_vals = WH.data.copy()
+        WH_vals[WH_vals == 0] = EPSILON
+        return csr_matrix((V.data / WH_vals, V.indices, V.indptr), shape=V.shape)
     if sp.issparse(V):
         ii, jj = V.nonzero()
         n_vals = ii.shape[0]
         #dot_vals = np.empty(n_vals)
 
-        dot_vals = V[(ii,jj)]/ WH[(ii, jj)]
-        VWH = sp.coo_matrix((np.array(dot_vals).squeeze(), (ii, jj)), shape=V.shape)
+        WH_vals = np.asarray(WH[(ii, jj)]).ravel()
+        # words pruned from every topic of a sparse H give WH == 0
+        WH_vals[WH_vals == 0] = EPSILON
+        dot_vals = np.asarray(V[(ii,jj)]).ravel() / WH_vals
+        VWH = sp.coo_matrix((dot_vals, (ii, jj)), shape=V.shape)
         return VWH.tocsr()
     else:
         return V/WH
 
 
-def _initialize_mmatrix(V, n_topics):
-    m, n = V.shape
-    W = np.abs(np.random.randn(m, n_topics) * 0.01)
-    H = np.abs(np.random.randn(n_topics, n) * 0.01)
+def check_random_state(random_state):
+    """None -> the global np.random state (the historical behaviour), an int or SeedSequence
+    -> a new np.random.Generator, a Generator or RandomState is used as is."""
+    if random_state is None:
+        return np.random.mtrand._rand
+    if isinstance(random_state, (np.random.Generator, np.random.RandomState)):
+        return random_state
+    return np.random.default_rng(random_state)
+
+
+def spawn_random_states(random_state, n):
+    """n independent child Generators for restarts or parallel workers, reproducible from one seed."""
+    if isinstance(random_state, np.random.Generator):
+        seed_sequence = np.random.SeedSequence(random_state.integers(2 ** 63))
+    elif isinstance(random_state, np.random.SeedSequence):
+        seed_sequence = random_state
+    else:
+        seed_sequence = np.random.SeedSequence(random_state)
+    return [np.random.default_rng(child) for child in seed_sequence.spawn(n)]
+
+
+def _random_seed(rng):
+    # integer seed for APIs that do not take a Generator
+    return int(rng.integers(2 ** 31 - 1)) if isinstance(rng, np.random.Generator) else int(rng.randint(2 ** 31 - 1))
+
+
+def _nndsvd(V, n_topics, rng):
+    """NNDSVD (Boutsidis & Gallopoulos) with zeros filled by the mean of V, since
+    multiplicative updates cannot move entries away from zero."""
+    from sklearn.utils.extmath import randomized_svd
+
+    U, S, Vt = randomized_svd(V, n_topics, random_state=_random_seed(rng))
+    W = np.zeros((V.shape[0], n_topics))
+    H = np.zeros((n_topics, V.shape[1]))
+    W[:, 0] = np.sqrt(S[0]) * np.abs(U[:, 0])
+    H[0, :] = np.sqrt(S[0]) * np.abs(Vt[0, :])
+    for j in range(1, n_topics):
+        x, y = U[:, j], Vt[j, :]
+        x_p, y_p = np.maximum(x, 0), np.maximum(y, 0)
+        x_n, y_n = np.abs(np.minimum(x, 0)), np.abs(np.minimum(y, 0))
+        x_p_norm, y_p_norm = norm(x_p), norm(y_p)
+        x_n_norm, y_n_norm = norm(x_n), norm(y_n)
+        # keep the sign pattern carrying more mass
+        if x_p_norm * y_p_norm >= x_n_norm * y_n_norm:
+            u, v, sigma = x_p / max(x_p_norm, EPSILON), y_p / max(y_p_norm, EPSILON), x_p_norm * y_p_norm
+        else:
+            u, v, sigma = x_n / max(x_n_norm, EPSILON), y_n / max(y_n_norm, EPSILON), x_n_norm * y_n_norm
+        scale = np.sqrt(S[j] * sigma)
+        W[:, j] = scale * u
+        H[j, :] = scale * v
+    mean = V.sum() / (V.shape[0] * V.shape[1])
+    W[W < EPSILON] = mean
+    H[H < EPSILON] = mean
     return W, H
 
-def kl_divergence(V, W, H):
-    if sp.issparse(V):
-        # compute np.dot(W, H) only where X is nonzero
-        WH_data = _special_sparse_dot(W, H, V).data
-        V_data = V.data
+
+def _seed_informed_H(H, seed_mask, seed_share=0.5):
+    """Raises the seed words of each guided topic so that they hold seed_share of its mass."""
+    seed_mask = seed_mask.tocoo()
+    if seed_mask.nnz == 0:
+        return H
+    seed_mass = np.asarray(seed_mask.tocsr().multiply(H).sum(axis=1)).ravel()
+    other_mass = H.sum(axis=1) - seed_mass
+    n_seeds = np.bincount(seed_mask.row, minlength=H.shape[0])
+    target = seed_share / (1 - seed_share) * other_mass / np.maximum(n_seeds, 1)
+    H[seed_mask.row, seed_mask.col] = np.maximum(H[seed_mask.row, seed_mask.col], target[seed_mask.row])
+    return H
+
+
+def _initialize_mmatrix(V, n_topics, random_state=None, init='random', seed_mask=None):
+    """init is 'random' (|N(0, 0.01^2)|), 'nndsvd', or 'seeded' (nndsvd with the seed words of
+    the guided topics holding half of their topic's mass)."""
+    m, n = V.shape
+    rng = check_random_state(random_state)
+    if init == 'random':
+        W = np.abs(rng.standard_normal((m, n_topics)) * 0.01)
+        H = np.abs(rng.standard_normal((n_topics, n)) * 0.01)
+    elif init in ('nndsvd', 'seeded'):
+        W, H = _nndsvd(V, n_topics, rng)
+        if init == 'seeded' and seed_mask is not None:
+            H = _seed_informed_H(H, seed_mask)
     else:
-        WH = np.dot(W, H)
-        WH_data = WH.ravel()
-        V_data = V.ravel()
+        raise ValueError(f"unknown init {init!r}, expected 'random', 'nndsvd' or 'seeded'")
+    return W, H
+
+def _row_blocks(n_rows, block_rows=None):
+    """(start, stop) row ranges of at most block_rows rows (one range when None)."""
+    if block_rows is None or block_rows >= n_rows:
+        yield 0, n_rows
+        return
+    for start in range(0, n_rows, block_rows):
+        yield start, min(start + block_rows, n_rows)
+
 
+def _rows(V, start, stop):
+    return V if start == 0 and stop == V.shape[0] else V[start:stop]
+
+
+def _kl_data_terms(V_data, WH_data, row_counts, sample_weight):
+    """sum(w V log(V / WH)) and sum(w V) over the entries of V above EPSILON."""
     indices = V_data > EPSILON
     WH_data = WH_data[indices]
     V_data = V_data[indices]
@@ -108,26 +229,118 @@ def kl_divergence(V, W, H):
 
     V_data[V_data < EPSILON] = EPSILON
 
-    sum_WH = np.dot(np.sum(W, axis=0), np.sum(H, axis=1))
+    entry_weight = 1.0 if sample_weight is None else np.repeat(sample_weight, row_counts)[indices]
     div = V_data / WH_data
-    res = np.dot(V_data, np.log(div))
-    res += sum_WH - V_data.sum()
+    return np.dot(entry_weight * V_data, np.log(div)), np.sum(entry_weight * V_data)
+
+
+def kl_divergence(V, W, H, sample_weight=None, block_rows=None, batch_size=None):
+    """Generalized KL divergence, per entry. sample_weight counts each row of V that many
+    times (e.g. the duplicate counts returned by dedup.deduplicate). A sparse V is scored
+    block_rows documents at a time (see plan_memory)."""
+    data_term = weighted_V = 0.0
+    if sp.issparse(V):
+        V = _canonical_csr(V)
+        for start, stop in _row_blocks(V.shape[0], block_rows):
+            V_rows = _rows(V, start, stop)
+            # compute np.dot(W, H) only where X is nonzero
+            WH_data = _special_sparse_dot(W[start:stop], H, V_rows, batch_size).data
+            terms = _kl_data_terms(V_rows.data, WH_data, np.diff(V_rows.indptr),
+                                   None if sample_weight is None else sample_weight[start:stop])
+            data_term += terms[0]
+            weighted_V += terms[1]
+    else:
+        WH = np.dot(W, H)
+        data_term, weighted_V = _kl_data_terms(V.ravel(), WH.ravel(), np.full(V.shape[0], V.shape[1]), sample_weight)
+
+    H_sum = np.asarray(H.sum(axis=1)).ravel()
+    if sample_weight is None:
+        sum_WH = np.dot(np.sum(W, axis=0), H_sum)
+        num_documents = V.shape[0]
+    else:
+        sum_WH = np.dot(sample_weight @ W, H_sum)
+        num_documents = sample_weight.sum()
+    res = data_term
+    res += sum_WH - weighted_V
 
-    num_documents = V.shape[0]
     num_vocab_terms = V.shape[1]
     return res / (num_documents * num_vocab_terms)
 
 
 
-def g1( V, W, MH_indices, seed_indices, W_max):
+def build_seed_mask(seed_indices, MH_indices, n_topics, n_vocab):
+    """Sparse topic x vocabulary seed mask.
+
+    seed_indices is either one list of vocabulary indices shared by every topic in
+    MH_indices, or a mapping topic -> seed indices (the guided topics are then its keys).
+    Returns the CSR mask and a boolean vector marking the guided topics.
+    """
+    if isinstance(seed_indices, Mapping):
+        groups = {int(topic): np.asarray(list(indices), dtype=int) for topic, indices in seed_indices.items()}
+    else:
+        shared = np.asarray(list(seed_indices), dtype=int)
+        groups = {int(topic): shared for topic in MH_indices}
+    guided = np.zeros(n_topics, dtype=bool)
+    guided[list(groups)] = True
+    rows = np.concatenate([np.full(len(indices), topic) for topic, indices in groups.items()] + [np.zeros(0, dtype=int)])
+    cols = np.concatenate(list(groups.values()) + [np.zeros(0, dtype=int)])
+    seed_mask = csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_topics, n_vocab))
+    seed_mask.data[:] = 1  # duplicated seed words are summed by the constructor
+    return seed_mask, guided
+
+
+def doc_seed_presence(V, seed_mask):
+    """Sparse m x k boolean matrix (CSR), True where the document contains a seed word of the topic."""
+    presence = csr_matrix(safe_sparse_dot(V, seed_mask.T))
+    presence.eliminate_zeros()
+    return presence.astype(bool)
+
+
+def zero_seed_pairs(seed_presence, guided, block_rows=65536):
+    """The g1 pairs: (document, guided topic) pairs whose document holds no seed word of the
+    topic, as an m x k boolean CSR pattern (sorted indices). Built block_rows documents at a time."""
+    presence = csr_matrix(seed_presence, dtype=bool)
+    topics = np.flatnonzero(guided)
+    indices, counts = [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=int)]
+    for start, stop in _row_blocks(presence.shape[0], block_rows):
+        missing = ~presence[start:stop][:, topics].toarray()
+        rows, cols = np.nonzero(missing)
+        indices.append(topics[cols].astype(np.int32))
+        counts.append(np.bincount(rows, minlength=stop - start))
+    indices = np.concatenate(indices)
+    indptr = np.concatenate([[0], np.cumsum(np.concatenate(counts))])
+    return csr_matrix((np.ones(len(indices), dtype=bool), indices, indptr), shape=presence.shape)
+
+
+def _pair_coords(pairs, start=0, stop=None):
+    """(rows relative to start, topics) of the pairs of a CSR pattern in rows start:stop, and
+    the slice of its data (and of multipliers stored along it) they occupy."""
+    stop = pairs.shape[0] if stop is None else stop
+    entries = slice(pairs.indptr[start], pairs.indptr[stop])
+    rows = np.repeat(np.arange(stop - start), np.diff(pairs.indptr[start:stop + 1]))
+    return rows, pairs.indices[entries], entries
+
+
+def g1( V, W, MH_indices, seed_indices, W_max, zero_seed_mask=None):
+    if zero_seed_mask is not None:
+        # precomputed (document, guided topic) pairs without any seed word of that topic
+        if sp.issparse(zero_seed_mask):
+            rows, cols, _ = _pair_coords(zero_seed_mask)
+            W[rows, cols] = np.minimum(W[rows, cols], W_max)
+        else:
+            W[zero_seed_mask] = np.minimum(W[zero_seed_mask], W_max)
+        return W
     doc_seedword_sums = np.sum(V[:, seed_indices], axis=1)
     zero_seedword_indices = np.where(doc_seedword_sums == 0)[0]
     W[zero_seedword_indices[:, np.newaxis], MH_indices] = np.minimum(W[zero_seedword_indices[:, np.newaxis], MH_indices], W_max)
     return W
 
 
-def g2(H, seed_indices, theta_min):
-    num = np.sum(H[:, seed_indices], axis=1)
+def g2(H, seed_indices, theta_min, seed_mask=None):
+    if seed_mask is not None:
+        num = np.asarray(seed_mask.multiply(H).sum(axis=1)).ravel()
+    else:
+        num = np.sum(H[:, seed_indices], axis=1)
     den = np.sum(H, axis=1)
     g2_value = theta_min - (num / den)
     return g2_value
@@ -176,80 +389,399 @@ def efficient_sparse_dot_with_ones(a, b, dense_output=False):
         return result.toarray()
     return result
 
-def update_W(V, W, H, lambda_, MH_indices, zero_seed_indices):
-    WH =_special_sparse_dot(W, H, V)
-    V_WH=_special_sparse_div(V, WH)
-    positive_term = safe_sparse_dot(V_WH, H.T)
+def zero_seed_mask_from_indices(zero_seed_indices, MH_indices, shape):
+    """Legacy g1 pairs: the listed documents are constrained on every MH topic (boolean CSR pattern)."""
+    rows = np.unique(np.asarray(list(zero_seed_indices), dtype=int))
+    rows = rows[(rows >= 0) & (rows < shape[0])]
+    topics = np.unique(np.asarray(MH_indices, dtype=int)).astype(np.int32)
+    counts = np.zeros(shape[0], dtype=int)
+    counts[rows] = len(topics)
+    indices = np.tile(topics, len(rows))
+    return csr_matrix((np.ones(len(indices), dtype=bool), indices, np.concatenate([[0], np.cumsum(counts)])),
+                      shape=shape)
+
+
+def update_W(V, W, H, lambda_, MH_indices, zero_seed_indices, g1_mask=None, block_rows=None, batch_size=None):
+    """lambda_ holds one g1 multiplier per pair of g1_mask (a CSR pattern, see zero_seed_pairs),
+    in its storage order; g1_mask is derived from zero_seed_indices when not given. Rows of W
+    only depend on the same rows of V, so they are updated block_rows documents at a time
+    (see plan_memory)."""
+    if g1_mask is None:
+        g1_mask = zero_seed_mask_from_indices(zero_seed_indices, MH_indices, W.shape)
+    g1_mask = csr_matrix(g1_mask)
     negative_term= np.sum(H, axis=1)
 
-    g1_W = np.zeros_like(W)
-
-    for i in zero_seed_indices:
-        if i < W.shape[0]:
-            g1_W[i, MH_indices] = 1
+    for start, stop in _row_blocks(V.shape[0], block_rows):
+        V_rows = _rows(V, start, stop)
+        WH =_special_sparse_dot(W[start:stop], H, V_rows, batch_size)
+        V_WH=_special_sparse_div(V_rows, WH)
+        positive_term = safe_sparse_dot(V_WH, H.T)
 
-    W *= positive_term / (negative_term + lambda_ * g1_W)
+        ratio = positive_term / negative_term
+        rows, cols, pairs = _pair_coords(g1_mask, start, stop)
+        ratio[rows, cols] = positive_term[rows, cols] / (negative_term[cols] + lambda_[pairs])
+        W[start:stop] *= ratio
     return W
 
 
-def update_H(V, W, H, mu, seed_indices, MH_indices):
-    WH =_special_sparse_dot(W, H, V)
-    V_WH=_special_sparse_div(V, WH)
-    positive_term = safe_sparse_dot(W.T, V_WH)
-    #negative_term = np.dot(W.T, np.ones(V.shape))
-    #negative_term = np.sum(W, axis=0)
-    negative_term = W.sum(axis=0)
+def update_H(V, W, H, mu, seed_indices, MH_indices, seed_mask=None, sample_weight=None,
+             block_rows=None, batch_size=None):
+    """mu holds one multiplier per topic. W.T (V / WH) is accumulated over blocks of
+    block_rows documents (see plan_memory)."""
+    positive_term = negative_term = None
+    for start, stop in _row_blocks(V.shape[0], block_rows):
+        V_rows, W_rows = _rows(V, start, stop), W[start:stop]
+        WH =_special_sparse_dot(W_rows, H, V_rows, batch_size)
+        V_WH=_special_sparse_div(V_rows, WH)
+        # a row of weight w stands for w identical documents; the W update is per row, so only H needs it
+        W_weighted = W_rows if sample_weight is None else W_rows * sample_weight[start:stop, np.newaxis]
+        block_positive = safe_sparse_dot(W_weighted.T, V_WH)
+        #negative_term = np.dot(W.T, np.ones(V.shape))
+        #negative_term = np.sum(W, axis=0)
+        block_negative = W_weighted.sum(axis=0)
+        if positive_term is None:
+            positive_term, negative_term = block_positive, block_negative
+        else:
+            positive_term += block_positive
+            negative_term += block_negative
 
-    num = np.sum(H[:, seed_indices], axis=1, keepdims=True)
-    den = np.sum(H, axis=1, keepdims=True)
+    if seed_mask is None:
+        seed_mask, _ = build_seed_mask(seed_indices, MH_indices, H.shape[0], H.shape[1])
+    seed_mask = seed_mask.tocoo()
+    guided = np.zeros(H.shape[0], dtype=bool)
+    guided[seed_mask.row] = True
 
-    g2_term = np.zeros_like(H)
-    for k in range(H.shape[0]):
-        if k in MH_indices:
-            g2_term[k, :] = num[k] / (den[k] ** 2)
-            g2_term[k, seed_indices] = -((den[k] - num[k]) / (den[k] ** 2))
+    num = np.asarray(seed_mask.tocsr().multiply(H).sum(axis=1)).ravel()
+    den = np.sum(H, axis=1)
 
-            denominator = negative_term[k] + g2_term[k, seed_indices]
+    # d(1 - num/den)/dH is num/den^2 on every word, minus 1/den on the topic's seed words
+    g2_term = np.zeros_like(H)
+    g2_term[guided, :] = (num[guided] / den[guided] ** 2)[:, np.newaxis]
+    g2_term[seed_mask.row, seed_mask.col] -= 1.0 / den[seed_mask.row]
 
     #H *= positive_term / (negative_term + mu * g2_term)   # optimized for large scale dataset by adding (negative_term[:, np.newaxis] instaed of negative_term to match the shape of H
-    H *= positive_term / (negative_term[:, np.newaxis] + mu * g2_term)
+    denominator = negative_term[:, np.newaxis] + mu[:, np.newaxis] * g2_term
+    # a large mu must not flip the sign of the seed words' denominator
+    H *= positive_term / np.maximum(denominator, 0.1 * negative_term[:, np.newaxis])
     return H
 
 
 
 
-def update_lambda(V, lambda_, W, MH_indices, seed_indices, W_max, eta):
-    g1_val = g1(V, W, MH_indices, seed_indices, W_max)
+def update_lambda(V, lambda_, W, MH_indices, seed_indices, W_max, eta, zero_seed_mask=None, g1_mask=None):
+    """Fixed step on the g1 multipliers, one per pair of g1_mask (see update_W)."""
+    g1_val = g1(V, W, MH_indices, seed_indices, W_max, zero_seed_mask)
+    rows, cols, _ = _pair_coords(g1_mask)
+    g1_val = g1_val[rows, cols]
     lambda_ = np.maximum(0, lambda_ + eta * g1_val)
     lambda_[g1_val < 0] = 0
 
     return lambda_
 
 
-def update_mu(mu, H, seed_indices, theta_min, eta):
-    g2_val = g2(H, seed_indices, theta_min)
-    g2_val_expanded = g2_val[:, np.newaxis]
-    mu_update = mu + eta * g2_val_expanded
+def update_mu(mu, H, seed_indices, theta_min, eta, seed_mask=None):
+    """Fixed step on mu, one multiplier per topic (g2 is a per-topic constraint)."""
+    g2_val = g2(H, seed_indices, theta_min, seed_mask)
+    mu_update = mu + eta * g2_val
     mu = np.maximum(0, mu_update)
     mu[g2_val < 0] = 0
     return mu
 
 
+def adapt_step_sizes(eta, violation, previous_violation, eta_init, growth=1.5, progress=0.9):
+    """Violation-driven step schedule, per topic: the step grows by `growth` while a constraint
+    stays violated without shrinking its violation below `progress` times the previous one,
+    and is reset to eta_init once the constraint holds."""
+    violated = violation > 0
+    stalled = violated & (violation > progress * previous_violation)
+    return np.where(violated, np.where(stalled, eta * growth, eta), eta_init)
+
+
+def adaptive_update_lambda(V, lambda_, W, H, MH_indices, seed_indices, W_max, eta, zero_seed_mask, g1_mask):
+    """Projected dual step on the g1 multipliers (one per pair of g1_mask, eta one step per
+    topic), on the relative violation (W - W_max) / max(W, W_max) and in units of the W update's
+    denominator, so eta is scale free. W is then clamped as in update_lambda.
+    Returns (lambda_, mean violation per topic)."""
+    rows, cols, _ = _pair_coords(g1_mask)
+    W_pairs = W[rows, cols]
+    g1_val = (W_pairs - W_max) / np.maximum(W_pairs, W_max)
+    lambda_ = np.maximum(0, lambda_ + eta[cols] * g1_val * np.sum(H, axis=1)[cols])
+    g1(V, W, MH_indices, seed_indices, W_max, zero_seed_mask)
+    n_topics = W.shape[1]
+    violation = (np.bincount(cols, np.maximum(g1_val, 0), n_topics)
+                 / np.maximum(np.bincount(cols, minlength=n_topics), 1))
+    return lambda_, violation
+
+
+def adaptive_update_mu(mu, H, seed_indices, theta_min, eta, seed_mask, negative_term):
+    """Projected dual step on mu in units of the H update's denominator (negative_term, the
+    column sums of the weighted W), so eta is scale free. mu is capped where the seed words'
+    denominator would drop below a tenth of negative_term. Returns (mu, violation per topic)."""
+    g2_val = g2(H, seed_indices, theta_min, seed_mask)
+    den = np.sum(H, axis=1)
+    scale = negative_term * den
+    mu = np.maximum(0, mu + eta * g2_val * scale)
+    # the seed words' denominator is negative_term - mu * (1 - seed share) / den
+    mu = np.minimum(mu, 0.9 * scale / np.maximum(1 - theta_min + g2_val, EPSILON))
+    return mu, np.maximum(g2_val, 0)
+
+
+def _keep_mask(H, top_k=None, threshold=None):
+    """Entries of a dense H kept by top-k per topic and/or a per-topic share threshold."""
+    keep = H > 0
+    if threshold is not None:
+        keep &= H >= threshold * H.sum(axis=1, keepdims=True)
+    if top_k is not None and top_k < H.shape[1]:
+        top = np.argpartition(H, -top_k, axis=1)[:, -top_k:]
+        in_top = np.zeros(H.shape, dtype=bool)
+        np.put_along_axis(in_top, top, True, axis=1)
+        keep &= in_top
+    return keep
+
+
+def sparsify_H(H, top_k=None, threshold=None):
+    """Returns H as CSR, keeping the top_k words of each topic and/or the words holding
+    at least `threshold` of the topic's total weight."""
+    if sp.issparse(H):
+        H = H.toarray()
+    return csr_matrix(np.where(_keep_mask(H, top_k, threshold), H, 0))
+
+
+def top_k_per_topic(H, top_k):
+    """(word indices, weights) of the top_k entries of every topic, largest first.
+    Works on dense H and on CSR H, where only the stored entries are considered."""
+    topics = []
+    if sp.issparse(H):
+        H = csr_matrix(H)
+        for k in range(H.shape[0]):
+            row = slice(H.indptr[k], H.indptr[k + 1])
+            order = np.argsort(-H.data[row], kind='stable')[:top_k]
+            topics.append((H.indices[row][order], H.data[row][order]))
+        return topics
+    top_k = min(top_k, H.shape[1])
+    top = np.argpartition(-H, top_k - 1, axis=1)[:, :top_k]
+    weights = np.take_along_axis(H, top, axis=1)
+    order = np.argsort(-weights, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    weights = np.take_along_axis(weights, order, axis=1)
+    return [(top[k], weights[k]) for k in range(H.shape[0])]
+
+
 # Track gradient norms
 def frobenius_norm(matrix):
     return np.linalg.norm(matrix, 'fro')
 
-def train(V, n_topics, MH_indices, W_max, zero_seed_indices, seed_indices, theta_min, max_iter=25, tol=1e-6):
+def parse_memory_limit(memory_limit):
+    """Bytes from an int, a string with a K/M/G/T suffix ('6G', '512M') or 'container'
+    (the cgroup memory limit of the running process)."""
+    if memory_limit is None or isinstance(memory_limit, (int, np.integer)):
+        return memory_limit
+    text = str(memory_limit).strip().upper()
+    if text == 'CONTAINER':
+        for path in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+            try:
+                with open(path) as f:
+                    value = f.read().strip()
+            except OSError:
+                continue
+            if value.isdigit() and int(value) < 2 ** 60:
+                return int(value)
+        raise ValueError("memory_limit='container' but no cgroup memory limit is set")
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+    if text[-1:] == 'B':
+        text = text[:-1]
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(float(text))
+
+
+def _format_bytes(n_bytes):
+    return f"{n_bytes / 2 ** 20:,.0f} MiB"
+
+
+def plan_memory(V, n_topics, memory_limit=None, n_pairs=None, mask_nnz=None, sample_weight=None,
+                sparsify=False, keep_best=False, min_batch=256):
+    """Expected peak memory of train() on V and the block sizes that keep it under memory_limit.
+
+    Resident: V, W, H, the sparse constraint masks and the multipliers (n_pairs is the number
+    of g1 multipliers, mask_nnz the stored entries of the seed presence, zero-seed and g1
+    masks; both default to the worst case m x k). Transient, one at a time: a block of
+    documents in the masked product / ratio matrix / KL (about 90 bytes per nonzero, 7 k-vectors
+    of 8 bytes per document and 3 batch x k arrays), the H-side products (k x n arrays), the
+    multiplier updates, the initialization and the H pruning.
+
+    Returns a dict with block_rows and batch_size for update_W/update_H/kl_divergence (None
+    means the whole corpus at once and the default batch), peak and a per-part breakdown.
+    Blocks shrink until the peak fits; raises MemoryError when even single documents do not."""
+    V = csr_matrix(V)
     m, n = V.shape
-    W, H = _initialize_mmatrix(V, n_topics)
-    lambda_ = np.zeros(W.shape)
-    mu = np.zeros(H.shape)
+    k = n_topics
+    nnz = V.nnz
+    n_pairs = m * k if n_pairs is None else n_pairs
+    mask_nnz = m * k if mask_nnz is None else mask_nnz
+    f8 = 8
+    resident = {
+        "V": V.data.nbytes + V.indices.nbytes + V.indptr.nbytes,
+        "W": m * k * f8,
+        "H": k * n * f8,
+        "constraint masks": 5 * mask_nnz + 3 * (m + 1) * f8,
+        "multipliers": n_pairs * f8 + 4 * k * f8,
+    }
+    if sample_weight is not None:
+        resident["sample weights"] = m * f8
+    if keep_best:
+        resident["best W, H"] = (m * k + k * n) * f8
+    transient = {
+        "H update": 5 * k * n * f8,
+        "multiplier updates": 6 * n_pairs * f8,
+        "initialization": 2 * m * k * f8,
+    }
+    if sparsify:
+        transient["H pruning"] = 19 * k * n
+
+    def block_bytes(block_rows, batch_size):
+        if block_rows >= m:
+            block_nnz = nnz
+        else:
+            bounds = np.append(V.indptr[::block_rows], V.indptr[-1])
+            block_nnz = int(np.diff(bounds).max())
+        # the copy of V's rows only exists when the corpus is split
+        copy = 12 * block_nnz + f8 * block_rows if block_rows < m else 0
+        return copy + 90 * block_nnz + block_rows * (7 * k * f8 + 24) + 3 * batch_size * k * f8 + 2 * k * n * f8
+
+    base = sum(resident.values())
+    fixed_peak = max(transient.values())
+    default_batch = max(k, nnz // max(k, 1))
+    limit = parse_memory_limit(memory_limit)
+
+    def fits(block_rows, batch_size):
+        return limit is None or base + max(fixed_peak, block_bytes(block_rows, batch_size)) <= limit
+
+    block_rows, batch_size = m, default_batch
+    if not fits(block_rows, batch_size):
+        # the largest batch that fits for the whole corpus, then the largest block of documents
+        batch_size = max(min_batch, (limit - base - block_bytes(m, 0)) // (3 * k * f8)) if limit > base else min_batch
+        batch_size = min(batch_size, default_batch)
+        if not fits(m, batch_size):
+            batch_size = min(min_batch, default_batch)
+            low, high = 1, m
+            while low < high:
+                middle = (low + high + 1) // 2
+                if fits(middle, batch_size):
+                    low = middle
+                else:
+                    high = middle - 1
+            block_rows = low
+    plan = {
+        "block_rows": None if block_rows >= m else block_rows,
+        "batch_size": None if batch_size == default_batch else int(batch_size),
+        "peak": base + max(fixed_peak, block_bytes(block_rows, batch_size)),
+        "limit": limit,
+        "resident": resident,
+        "transient": dict(transient, **{"document block": block_bytes(block_rows, batch_size)}),
+    }
+    if not fits(block_rows, batch_size):
+        raise MemoryError(f"train needs at least {_format_bytes(plan['peak'])} for V {m} x {n} "
+                          f"({nnz} nonzeros) and {k} topics, above the memory limit of {_format_bytes(limit)}: "
+                          + describe_memory_plan(plan))
+    return plan
+
+
+def describe_memory_plan(plan):
+    parts = ", ".join(f"{name} {_format_bytes(size)}" for name, size in
+                      list(plan["resident"].items()) + list(plan["transient"].items()))
+    blocks = "whole corpus" if plan["block_rows"] is None else f"blocks of {plan['block_rows']} documents"
+    batch = "default batch" if plan["batch_size"] is None else f"batches of {plan['batch_size']} nonzeros"
+    return f"expected peak {_format_bytes(plan['peak'])} ({blocks}, {batch}; {parts})"
+
+
+def train(V, n_topics, MH_indices, W_max, zero_seed_indices, seed_indices, theta_min, max_iter=25, tol=1e-6,
+          H_top_k=None, H_threshold=None, sparsify_from=None, sample_weight=None,
+          W_init=None, H_init=None, seed_presence=None, V_heldout=None, eval_every=5, patience=2,
+          random_state=None, init='random', step_schedule='fixed', eta=None, memory_limit=None):
+    """seed_indices is one list applied to every MH topic, or a mapping topic -> seed indices
+    (MH_indices is then ignored). zero_seed_indices=None derives the g1 documents per topic.
+
+    With H_top_k and/or H_threshold, H is pruned every iteration from `sparsify_from`
+    (default: the last quarter of max_iter) and returned as CSR, see sparsify_H. During the
+    fit H stays dense with the pruned entries zeroed, so only the returned H saves memory.
+
+    sample_weight gives each row of V a multiplicity in the objective, so a corpus collapsed
+    by dedup.deduplicate learns the same topics; expand W with W[inverse] afterwards.
+
+    random_state (None: global np.random, int, SeedSequence or Generator) and init
+    ('random', 'nndsvd', 'seeded') control the initialization, see _initialize_mmatrix.
+    W_init/H_init warm-start the fit (copied, not modified); seed_presence passes a
+    precomputed doc_seed_presence(V, seed_mask) when fitting the same V repeatedly.
+
+    With V_heldout (a matrix of held-out documents, or a zero-argument callable returning a
+    fresh iterator of row chunks for every evaluation), heldout_kl is evaluated every
+    eval_every iterations; after `patience` evaluations without improvement the fit stops and
+    the best W, H are returned. NaN scores (no held-out documents) are reported and ignored.
+
+    The Lagrange multipliers are stored compactly: lambda_ as one value per constrained
+    (document, topic) pair of the sparse g1 mask (see zero_seed_pairs) and mu as one value
+    per topic; the seed presence and g1 masks are sparse too. step_schedule
+    'fixed' (default) is the original constant step (eta defaults to 0.001); 'adaptive' takes
+    scale-free dual steps whose per-topic size grows while a constraint stays violated (see
+    adapt_step_sizes, eta defaults to 1.0). 'adaptive' requires zero_seed_indices=None and
+    raises a ValueError otherwise: on the legacy g1 documents it drives every guided-topic W
+    entry to W_max and the guided H rows grow without bound.
+
+    With memory_limit (bytes, '6G', or 'container' for the cgroup limit), plan_memory picks
+    the document block and batch sizes of the updates, the expected peak is printed before the
+    first iteration, and a MemoryError is raised when the fit cannot stay under the limit."""
+    if step_schedule not in ('adaptive', 'fixed'):
+        raise ValueError(f"unknown step_schedule {step_schedule!r}, expected 'adaptive' or 'fixed'")
+    adaptive = step_schedule == 'adaptive'
+    if adaptive and zero_seed_indices is not None:
+        raise ValueError("step_schedule='adaptive' needs zero_seed_indices=None (g1 documents derived per topic)")
+    if eta is None:
+        eta = 1.0 if adaptive else 0.001
+    if not (V_heldout is None or callable(V_heldout) or sp.issparse(V_heldout) or isinstance(V_heldout, np.ndarray)):
+        # a generator would be used up by the first evaluation
+        raise TypeError("V_heldout must be a matrix or a callable returning a fresh iterator of row chunks")
+    m, n = V.shape
+    if sp.issparse(V):
+        # TfidfVectorizer output has unsorted indices; canonicalize once for every update
+        V = _canonical_csr(V)
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight, dtype=float)
+    # seed constraints are fixed for the whole fit, so precompute their sparse masks once
+    seed_mask, guided = build_seed_mask(seed_indices, MH_indices, n_topics, n)
+    MH_indices = np.flatnonzero(guided)
+    if seed_presence is None:
+        seed_presence = doc_seed_presence(V, seed_mask)
+    zero_seed_mask = zero_seed_pairs(seed_presence, guided)
+    if zero_seed_indices is None:
+        g1_mask = zero_seed_mask
+    else:
+        g1_mask = zero_seed_mask_from_indices(zero_seed_indices, MH_indices, (m, n_topics))
+    block_rows = batch_size = None
+    if memory_limit is not None:
+        mask_nnz = csr_matrix(seed_presence).nnz + zero_seed_mask.nnz + (g1_mask.nnz if g1_mask is not zero_seed_mask else 0)
+        plan = plan_memory(V, n_topics, memory_limit, g1_mask.nnz, mask_nnz, sample_weight,
+                           H_top_k is not None or H_threshold is not None, V_heldout is not None)
+        block_rows, batch_size = plan["block_rows"], plan["batch_size"]
+        print(f"Memory plan: {describe_memory_plan(plan)}, limit {_format_bytes(plan['limit'])}")
+    if W_init is not None and H_init is not None:
+        W, H = np.array(W_init, dtype=float), np.array(H_init, dtype=float)
+    else:
+        W, H = _initialize_mmatrix(V, n_topics, random_state, init, seed_mask)
+    lambda_ = np.zeros(g1_mask.nnz)
+    mu = np.zeros(n_topics)
+    eta_lambda, eta_mu = np.full(n_topics, eta), np.full(n_topics, eta)
+    g1_violation, g2_violation = np.zeros(n_topics), np.zeros(n_topics)
     kl_losses = []
+    sparsify = H_top_k is not None or H_threshold is not None
+    if sparsify_from is None:
+        sparsify_from = max_iter - max(1, max_iter // 4)
+    best_heldout, stale_evaluations, best = np.inf, 0, None
     grad_W_norms = []
     grad_H_norms = []
     for i in range(0, max_iter):
 
-        kl_loss = kl_divergence(V, W, H)
+        kl_loss = kl_divergence(V, W, H, sample_weight, block_rows, batch_size)
         kl_losses.append(kl_loss)
         #grad_W = gradient_W(V, W, H, lambda_, MH_indices, W_max, zero_seed_indices)
         #grad_H = gradient_H(V, W, H, mu, seed_indices, theta_min)
@@ -268,24 +800,252 @@ def train(V, n_topics, MH_indices, W_max, zero_seed_indices, seed_indices, theta
 
 
 
-        W = update_W(V, W, H, lambda_, MH_indices, zero_seed_indices)
-        H = update_H(V, W, H, mu, seed_indices, MH_indices)
-        lambda_ = update_lambda(V, lambda_, W, MH_indices, seed_indices, W_max, eta=0.001)
-        mu = update_mu(mu, H, seed_indices, theta_min, eta=0.001)
+        W = update_W(V, W, H, lambda_, MH_indices, zero_seed_indices, g1_mask, block_rows, batch_size)
+        H = update_H(V, W, H, mu, seed_indices, MH_indices, seed_mask, sample_weight, block_rows, batch_size)
+        if adaptive:
+            negative_term = (W if sample_weight is None else W * sample_weight[:, np.newaxis]).sum(axis=0)
+            lambda_, violation = adaptive_update_lambda(V, lambda_, W, H, MH_indices, seed_indices, W_max,
+                                                        eta_lambda, zero_seed_mask, g1_mask)
+            eta_lambda, g1_violation = adapt_step_sizes(eta_lambda, violation, g1_violation, eta), violation
+            mu, violation = adaptive_update_mu(mu, H, seed_indices, theta_min, eta_mu, seed_mask, negative_term)
+            eta_mu, g2_violation = adapt_step_sizes(eta_mu, violation, g2_violation, eta), violation
+        else:
+            lambda_ = update_lambda(V, lambda_, W, MH_indices, seed_indices, W_max, eta=eta,
+                                    zero_seed_mask=zero_seed_mask, g1_mask=g1_mask)
+            mu = update_mu(mu, H, seed_indices, theta_min, eta=eta, seed_mask=seed_mask)
+        if sparsify and i >= sparsify_from:
+            # pruned entries stay at zero under the multiplicative updates
+            H[~_keep_mask(H, H_top_k, H_threshold)] = 0
         # Stopping criterion based on tolerance (using KL divergence)
         if kl_loss < tol:
             print(f"Converged at iteration {i}, KL Divergence: {kl_loss}")
             break
-    kl_loss = kl_divergence(V, W, H)
+        if V_heldout is not None and (i + 1) % eval_every == 0:
+            heldout_loss = heldout_kl(V_heldout() if callable(V_heldout) else V_heldout, H)
+            print(f'Iteration {i}, held-out KL Divergence: {heldout_loss}')
+            if np.isnan(heldout_loss):
+                continue
+            if heldout_loss < best_heldout:
+                best_heldout, stale_evaluations, best = heldout_loss, 0, (W.copy(), H.copy())
+            else:
+                stale_evaluations += 1
+                if stale_evaluations >= patience and best is not None:
+                    print(f"Early stopping at iteration {i}, best held-out KL Divergence: {best_heldout}")
+                    W, H = best
+                    break
+    kl_loss = kl_divergence(V, W, H, sample_weight, block_rows, batch_size)
     kl_losses.append(kl_loss)
 
     #W = normalize_matrix(W)
     #H = normalize_matrix(H)
+    if sparsify:
+        H = sparsify_H(H, H_top_k, H_threshold)
     return W, H, kl_losses
 
 
+def train_restarts(V, n_topics, MH_indices, W_max, zero_seed_indices, seed_indices, theta_min, n_restarts=3,
+                   random_state=None, **kwargs):
+    """Runs train n_restarts times on independent child streams of random_state and keeps
+    the fit with the lowest final KL divergence."""
+    best = None
+    for rng in spawn_random_states(random_state, n_restarts):
+        W, H, kl_losses = train(V, n_topics, MH_indices, W_max, zero_seed_indices, seed_indices, theta_min,
+                                random_state=rng, **kwargs)
+        if best is None or kl_losses[-1] < best[2][-1]:
+            best = (W, H, kl_losses)
+    return best
+
+
+def fold_in(V, H, max_iter=30, tol=1e-4):
+    """Solves for W with H fixed (KL multiplicative updates), used to score unseen documents.
+
+    Stops once no entry of W moves by more than tol; tol=None always runs max_iter iterations,
+    so every row gets the same updates whichever other rows are folded in with it."""
+    V = csr_matrix(V)
+    n_topics = H.shape[0]
+    W = np.full((V.shape[0], n_topics), 1.0 / n_topics)
+    H_sum = np.asarray(H.sum(axis=1)).ravel()
+    H_sum[H_sum < EPSILON] = EPSILON
+    H_T = H.T.tocsr() if sp.issparse(H) else H.T
+    # H is fixed, so the rows of H.T at the nonzeros of V are gathered only once
+    rows = np.repeat(np.arange(V.shape[0]), np.diff(V.indptr))
+    H_cols = H_T[V.indices]
+    if sp.issparse(H_cols):
+        H_cols = H_cols.toarray()
+    V_WH = V.copy()
+    for i in range(0, max_iter):
+        WH_data = np.einsum('ij,ij->i', W[rows], H_cols)
+        WH_data[WH_data < EPSILON] = EPSILON
+        V_WH.data = V.data / WH_data
+        VH = safe_sparse_dot(V_WH, H_T)
+        if sp.issparse(VH):
+            VH = VH.toarray()
+        W_new = W * VH / H_sum
+        delta = np.abs(W_new - W).max() if tol is not None and W.size else 0.0
+        W = W_new
+        if tol is not None and delta < tol:
+            break
+    return W
 
 
-
-
-
+def _row_chunks(V, chunk_size):
+    if sp.issparse(V) or isinstance(V, np.ndarray):
+        for start in range(0, V.shape[0], chunk_size):
+            yield V[start:start + chunk_size]
+    else:
+        yield from V
+
+
+def heldout_kl(V, H, chunk_size=10000, fold_in_iter=30, completion_fraction=None, random_state=0):
+    """Generalized KL of held-out documents under a fixed H, through the fold-in path.
+
+    V is a matrix or any iterable of row chunks (e.g. vectorized CSV chunks), scored
+    chunk_size rows at a time so memory stays bounded by one chunk. By default every
+    document is folded in and scored whole, normalized like kl_divergence. With
+    completion_fraction, that share of each document's words is hidden, W is folded in
+    on the rest and the KL is averaged over the hidden entries (document completion).
+    Every document gets exactly fold_in_iter fold-in iterations, so the result does not
+    depend on chunk_size.
+    """
+    rng = np.random.RandomState(random_state)
+    total, n_rows, n_hidden = 0.0, 0, 0
+    for chunk in _row_chunks(V, chunk_size):
+        chunk = _canonical_csr(chunk)
+        if chunk.shape[0] == 0:
+            continue
+        if completion_fraction is None:
+            W = fold_in(chunk, H, max_iter=fold_in_iter, tol=None)
+            total += kl_divergence(chunk, W, H) * chunk.shape[0] * chunk.shape[1]
+            n_rows += chunk.shape[0]
+            continue
+        hidden = rng.rand(chunk.nnz) < completion_fraction
+        # separate copies: eliminate_zeros compacts indices in place, and the two halves
+        # must not share them (or chunk's)
+        observed, held = chunk.copy(), chunk.copy()
+        observed.data[hidden] = 0
+        held.data[~hidden] = 0
+        observed.eliminate_zeros()
+        held.eliminate_zeros()
+        W = fold_in(observed, H, max_iter=fold_in_iter, tol=None)
+        WH_data = _special_sparse_dot(W, H, held).data
+        WH_data[WH_data < EPSILON] = EPSILON
+        V_data = np.maximum(held.data, EPSILON)
+        total += np.sum(V_data * np.log(V_data / WH_data) - V_data + WH_data)
+        n_hidden += held.nnz
+    if completion_fraction is not None:
+        return total / n_hidden if n_hidden else np.nan
+    return total / (n_rows * H.shape[1]) if n_rows else np.nan
+
+
+def save_model(path, H, vectorizer):
+    """Stores H (dense or CSR) together with the fitted TfidfVectorizer state (vocabulary, idf, tokenizer params)."""
+    feature_names = np.asarray(vectorizer.get_feature_names_out(), dtype=str)
+    params = {}
+    for key, value in vectorizer.get_params().items():
+        if key == "dtype" and np.dtype(value) == np.float64:
+            continue  # the default, restored by load_model
+        if not isinstance(value, (str, int, float, bool, tuple, list, type(None))):
+            raise ValueError(f"cannot save vectorizer parameter {key}={value!r}; "
+                             "callables and other non-JSON values would be lost on load")
+        params[key] = value
+    if sp.issparse(H):
+        H = csr_matrix(H)
+        arrays = {"H_data": H.data, "H_indices": H.indices, "H_indptr": H.indptr, "H_shape": np.asarray(H.shape)}
+    else:
+        arrays = {"H": H}
+    np.savez(path, feature_names=feature_names, idf=vectorizer.idf_,
+             params=np.asarray(json.dumps(params)), **arrays)
+
+
+class SavedTfidfVectorizer:
+    """transform-only stand-in for a fitted word-level TfidfVectorizer, rebuilt from the state
+    stored by save_model without importing scikit-learn. Produces the same matrices."""
+
+    def __init__(self, feature_names, idf, params):
+        self.params = params
+        self.vocabulary_ = {word: i for i, word in enumerate(feature_names.tolist())}
+        self.idf_ = idf
+        self._feature_names = feature_names
+        self._token_pattern = re.compile(params.get("token_pattern", r"(?u)\b\w\w+\b"))
+
+    @staticmethod
+    def supports(params):
+        return (params.get("analyzer", "word") == "word" and params.get("input", "content") == "content"
+                and params.get("stop_words") is None and params.get("vocabulary") is None)
+
+    def get_params(self, deep=True):
+        return dict(self.params)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self._feature_names, dtype=object)
+
+    def _tokens(self, document):
+        if isinstance(document, bytes):
+            document = document.decode(self.params.get("encoding", "utf-8"), self.params.get("decode_error", "strict"))
+        if self.params.get("lowercase", True):
+            document = document.lower()
+        strip_accents = self.params.get("strip_accents")
+        if strip_accents == "ascii":
+            document = unicodedata.normalize("NFKD", document).encode("ASCII", "ignore").decode("ASCII")
+        elif strip_accents == "unicode":
+            document = "".join(c for c in unicodedata.normalize("NFKD", document) if not unicodedata.combining(c))
+        tokens = self._token_pattern.findall(document)
+        min_n, max_n = self.params.get("ngram_range", (1, 1))
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            ngrams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+    def transform(self, raw_documents):
+        vocabulary = self.vocabulary_
+        indices, indptr = [], [0]
+        for document in raw_documents:
+            indices.extend(j for j in map(vocabulary.get, self._tokens(document)) if j is not None)
+            indptr.append(len(indices))
+        X = csr_matrix((np.ones(len(indices)), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+                       shape=(len(indptr) - 1, len(vocabulary)))
+        X.sum_duplicates()
+        if self.params.get("binary", False):
+            X.data[:] = 1.0
+        if self.params.get("sublinear_tf", False):
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.params.get("use_idf", True):
+            X.data *= self.idf_[X.indices]
+        norm_type = self.params.get("norm", "l2")
+        if norm_type is not None:
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            values = np.abs(X.data) if norm_type == "l1" else X.data ** 2
+            row_norms = np.bincount(rows, weights=values, minlength=X.shape[0])
+            if norm_type == "l2":
+                row_norms = np.sqrt(row_norms)
+            row_norms[row_norms == 0] = 1
+            X.data /= row_norms[rows]
+        return X
+
+
+def load_model(path):
+    """Loads a model written by save_model, returns (H, vectorizer).
+
+    Word-level vectorizers come back as a SavedTfidfVectorizer, which keeps scikit-learn out
+    of the import path of scoring jobs; other analyzers are rebuilt as a TfidfVectorizer."""
+    with np.load(path, allow_pickle=False) as model:
+        if "H_data" in model:
+            H = csr_matrix((model["H_data"], model["H_indices"], model["H_indptr"]), shape=tuple(model["H_shape"]))
+        else:
+            H = model["H"]
+        feature_names = model["feature_names"]
+        idf = model["idf"]
+        params = json.loads(str(model["params"]))
+    if "ngram_range" in params:
+        params["ngram_range"] = tuple(params["ngram_range"])
+    if SavedTfidfVectorizer.supports(params):
+        return H, SavedTfidfVectorizer(feature_names, idf, params)
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {word: i for i, word in enumerate(feature_names.tolist())}
+    vectorizer.idf_ = idf
+    return H, vectorizer
@@ -0,0 +1,168 @@
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from OurAlgorithm import save_model, top_k_per_topic, train
+from vocabulary import build_vocabulary, seed_group_indices
+
+DEFAULTS = {
+    "text_column": "Sentence",
+    "n_topics": 15,
+    "W_max": 1e-9,
+    "theta_min": 0.4,
+    "MH_indices": [0, 1, 2, 3, 4, 5, 6, 7],
+    "max_iteration": 40,
+    "min_df": 1,
+    "max_df": 1.0,
+    "max_features": None,
+    "n_top_words": 10,
+    "random_state": None,
+    "init": "random",
+    "step_schedule": "fixed",
+    "memory_limit": None,
+}
+
+
+def read_manifest(path):
+    """One JSON object per line: at least `name` and `data_path`, plus `seed_words`
+    (list), `seed_words_path` (one word per line) or `seed_groups` (topic -> words)
+    and any of the DEFAULTS keys."""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if "name" not in entry or "data_path" not in entry:
+                raise ValueError(f"{path}:{line_number}: manifest entries need 'name' and 'data_path'")
+            entries.append(entry)
+    return entries
+
+
+def _seed_words(entry):
+    if "seed_words_path" in entry:
+        with open(entry["seed_words_path"], encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    if "seed_groups" in entry:
+        return [word for words in entry["seed_groups"].values() for word in words]
+    return entry.get("seed_words", [])
+
+
+def run_corpus(entry, models_dir=None):
+    """Fits one manifest entry, returns a JSON-serialisable result record."""
+    config = dict(DEFAULTS, **entry)
+    start = time.time()
+    try:
+        data = pd.read_csv(config["data_path"])
+        tfidf_matrix, vectorizer, seed_indices, non_seed_indices, missing_seed_words = build_vocabulary(
+            data[config["text_column"]].astype(str), _seed_words(config), min_df=config["min_df"],
+            max_df=config["max_df"], max_features=config["max_features"])
+        if "seed_groups" in config:
+            seed_indices, _ = seed_group_indices(vectorizer.get_feature_names_out(), config["seed_groups"],
+                                                 vectorizer.lowercase)
+            non_seed_indices = None
+        if config["step_schedule"] == "adaptive":
+            # the adaptive steps only stay bounded with the per-topic g1 documents
+            non_seed_indices = None
+        # train reports every iteration, which would interleave across workers
+        with contextlib.redirect_stdout(io.StringIO()):
+            W, H, kl_losses = train(tfidf_matrix, config["n_topics"], config["MH_indices"], config["W_max"],
+                                    non_seed_indices, seed_indices, config["theta_min"], int(config["max_iteration"]),
+                                    random_state=config["random_state"], init=config["init"],
+                                    step_schedule=config["step_schedule"], memory_limit=config["memory_limit"])
+        feature_names = vectorizer.get_feature_names_out()
+        topics = [[(feature_names[i], float(weight)) for i, weight in zip(words, weights)]
+                  for words, weights in top_k_per_topic(H, config["n_top_words"])]
+        if models_dir:
+            save_model(os.path.join(models_dir, f"{config['name']}.npz"), H, vectorizer)
+        return {
+            "name": config["name"],
+            "status": "ok",
+            "n_documents": tfidf_matrix.shape[0],
+            "n_vocab": tfidf_matrix.shape[1],
+            "kl": float(kl_losses[-1]),
+            "missing_seed_words": missing_seed_words,
+            "topics": topics,
+            "doc_topics": np.argmax(W, axis=1).tolist(),
+            "seconds": time.time() - start,
+        }
+    except Exception as e:
+        return {"name": config["name"], "status": "error", "error": f"{type(e).__name__}: {e}",
+                "seconds": time.time() - start}
+
+
+def _warm_worker():
+    # one BLAS thread per worker process, the pool provides the parallelism; numpy is already
+    # loaded, so its thread pools are capped at runtime (the variables cover later loads)
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)
+    # pay the import and first-call costs once per worker instead of once per corpus
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    TfidfVectorizer().fit_transform(["warm up the vectorizer", "and the sparse code paths"])
+
+
+def _run_task(task):
+    entry, models_dir = task
+    return run_corpus(entry, models_dir)
+
+
+def run_batch(entries, output_path, workers=None, models_dir=None, chunksize=4, random_state=None):
+    """Fits every manifest entry on a persistent pool, streaming one JSON line per corpus
+    to output_path as results arrive. Returns (n_ok, n_failed, corpora_per_minute).
+
+    With random_state, entries without their own random_state get independent child seeds,
+    so results do not depend on which worker fits which corpus."""
+    if models_dir:
+        os.makedirs(models_dir, exist_ok=True)
+    if random_state is not None:
+        children = np.random.SeedSequence(random_state).spawn(len(entries))
+        entries = [entry if "random_state" in entry else dict(entry, random_state=child)
+                   for entry, child in zip(entries, children)]
+    start = time.time()
+    n_ok = n_failed = 0
+    tasks = [(entry, models_dir) for entry in entries]
+    with multiprocessing.Pool(workers, initializer=_warm_worker) as pool, \
+            open(output_path, "w", encoding="utf-8") as output:
+        for result in pool.imap_unordered(_run_task, tasks, chunksize=chunksize):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            if result["status"] == "ok":
+                n_ok += 1
+            else:
+                n_failed += 1
+                print(f"{result['name']}: {result['error']}")
+    elapsed = time.time() - start
+    return n_ok, n_failed, 60.0 * len(entries) / elapsed if elapsed > 0 else 0.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch training of many small corpora on a shared worker pool")
+    parser.add_argument('--manifest', type=str, required=True, help="JSONL manifest, one corpus and seed configuration per line")
+    parser.add_argument('--output_path', type=str, default='./batch_results.jsonl', help="JSONL file receiving one result per corpus")
+    parser.add_argument('--models_dir', type=str, default=None, help="Optional directory to save each model (.npz)")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--random_state', type=int, default=None, help="Seed from which every corpus gets its own child stream")
+    parser.add_argument('--chunksize', type=int, default=4, help="Corpora handed to a worker per dispatch")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    entries = read_manifest(args.manifest)
+    n_ok, n_failed, throughput = run_batch(entries, args.output_path, args.workers, args.models_dir, args.chunksize,
+                                         args.random_state)
+    print(f"{n_ok} corpora trained, {n_failed} failed, {throughput:.1f} corpora/minute")
+    print(f"Results saved to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def _post(connection, texts):
+    body = json.dumps({"texts": texts})
+    start = time.perf_counter()
+    connection.request("POST", "/score", body, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    if response.status != 200:
+        raise RuntimeError(f"/score returned {response.status}")
+    return time.perf_counter() - start
+
+
+def _get_json(host, port, path):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request("GET", path)
+    payload = json.loads(connection.getresponse().read())
+    connection.close()
+    return payload
+
+
+def measure_load(host, port, texts, clients=16, duration_s=10.0, docs_per_request=1):
+    """Closed-loop load: `clients` threads each post `docs_per_request` documents back to back
+    for duration_s. Returns client-side latency percentiles (ms) and throughput."""
+    latencies = [[] for _ in range(clients)]
+    errors = []
+    deadline = time.perf_counter() + duration_s
+
+    def client(i):
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        rng = np.random.default_rng(i)
+        try:
+            while time.perf_counter() < deadline:
+                batch = [texts[j] for j in rng.integers(len(texts), size=docs_per_request)]
+                latencies[i].append(_post(connection, batch))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    all_latencies = np.concatenate([np.asarray(l) for l in latencies]) * 1000.0
+    if errors or not all_latencies.size:
+        raise RuntimeError(f"load run failed: {errors[0] if errors else 'no request completed'}")
+    p50, p99 = np.percentile(all_latencies, [50, 99]).tolist()
+    return {"requests": int(all_latencies.size), "p50_ms": p50, "p99_ms": p99,
+            "docs_per_s": all_latencies.size * docs_per_request / elapsed}
+
+
+def _wait_ready(host, port, process, timeout_s=60.0):
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("serve.py exited before it was ready")
+        try:
+            if _get_json(host, port, "/health")["status"] == "ok":
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("serve.py did not become ready")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load benchmark: latency and throughput of serve.py under concurrent clients")
+    parser.add_argument('--model_path', type=str, required=True, help="Model saved by script-run.py --model_path (.npz)")
+    parser.add_argument('--data_path', type=str, required=True, help="CSV whose text column supplies the request documents")
+    parser.add_argument('--text_column', type=str, default='Sentence', help="Column holding the documents")
+    parser.add_argument('--port', type=int, default=8765, help="Port the benchmarked server binds on 127.0.0.1")
+    parser.add_argument('--workers', type=int, default=1, help="serve.py worker processes")
+    parser.add_argument('--clients', type=int, default=16, help="Concurrent client connections")
+    parser.add_argument('--docs_per_request', type=int, default=1, help="Documents posted per request")
+    parser.add_argument('--duration_s', type=float, default=10.0, help="Length of the measured run")
+    parser.add_argument('--budget_ms', type=float, default=20.0, help="Exit with status 1 when the p99 latency exceeds this")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    texts = pd.read_csv(args.data_path)[args.text_column].astype(str).tolist()
+    here = os.path.dirname(os.path.abspath(__file__))
+    host = "127.0.0.1"
+    with socket.socket() as probe:
+        if probe.connect_ex((host, args.port)) == 0:
+            sys.exit(f"{host}:{args.port} is already in use, pick another --port")
+    server = subprocess.Popen([sys.executable, os.path.join(here, "serve.py"), "--model_path", args.model_path,
+                               "--host", host, "--port", str(args.port), "--workers", str(args.workers)],
+                              stdout=subprocess.DEVNULL)
+    try:
+        _wait_ready(host, args.port, server)
+        # short warm-up so first-call costs stay out of the percentiles
+        measure_load(host, args.port, texts, args.clients, min(1.0, args.duration_s), args.docs_per_request)
+        result = measure_load(host, args.port, texts, args.clients, args.duration_s, args.docs_per_request)
+        stats = _get_json(host, args.port, "/stats")
+    finally:
+        # SIGINT lets serve.py run its shutdown path, which also stops forked workers
+        server.send_signal(signal.SIGINT)
+        server.wait()
+    print(f"requests:   {result['requests']} from {args.clients} clients, {args.workers} worker(s)")
+    print(f"throughput: {result['docs_per_s']:.0f} docs/s")
+    print(f"latency:    p50 {result['p50_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print(f"server:     {stats['requests']} requests, mean batch {stats['mean_batch_size']:.1f} docs")
+    sys.exit(0 if result["p99_ms"] <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# runs in a fresh interpreter so every measurement pays the full import cost
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import numpy, scipy.sparse
+dependencies = time.perf_counter()
+import OurAlgorithm
+imported = time.perf_counter()
+H, vectorizer = OurAlgorithm.load_model(sys.argv[1])
+loaded = time.perf_counter()
+print(json.dumps({"dependencies_ms": 1e3 * (dependencies - start), "import_ms": 1e3 * (imported - dependencies),
+                  "load_ms": 1e3 * (loaded - imported), "total_ms": 1e3 * (loaded - start),
+                  "sklearn_imported": "sklearn" in sys.modules}))
+"""
+
+
+def measure_startup(model_path, repeats=5):
+    """Median timings (ms) of importing OurAlgorithm and loading model_path, one fresh process per run."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", PROBE, os.path.abspath(model_path)], cwd=here,
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    result = {key: statistics.median(run[key] for run in runs) for key in runs[0] if key.endswith("_ms")}
+    result["sklearn_imported"] = any(run["sklearn_imported"] for run in runs)
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Startup benchmark: import OurAlgorithm and load a saved model")
+    parser.add_argument('--model_path', type=str, required=True, help="Model saved by script-run.py --model_path (.npz)")
+    parser.add_argument('--repeats', type=int, default=5, help="Fresh interpreter runs, the median is reported")
+    parser.add_argument('--budget_ms', type=float, default=200.0, help="Exit with status 1 when the median total exceeds this")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    result = measure_startup(args.model_path, args.repeats)
+    print(f"numpy + scipy.sparse: {result['dependencies_ms']:.1f} ms")
+    print(f"import OurAlgorithm:  {result['import_ms']:.1f} ms")
+    print(f"load_model:           {result['load_ms']:.1f} ms")
+    print(f"total:                {result['total_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if result["sklearn_imported"]:
+        print("scikit-learn was imported while loading the model")
+    sys.exit(0 if result["total_ms"] <= args.budget_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
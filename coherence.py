@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+from scipy.sparse import csc_matrix, csr_matrix
+
+
+class CooccurrenceIndex:
+    """Binary document-term index of a corpus, built once and reused for every topic of
+    every model. Co-occurrence counts are computed on demand for the words in play only."""
+
+    def __init__(self, doc_term, feature_names):
+        self.doc_term = csc_matrix(doc_term, dtype=np.float32)
+        self.feature_names = np.asarray(feature_names)
+        self.word2id = {word: i for i, word in enumerate(self.feature_names.tolist())}
+        self.n_docs = self.doc_term.shape[0]
+
+    @classmethod
+    def from_matrix(cls, V, feature_names):
+        binary = csr_matrix(V, copy=True)
+        binary.eliminate_zeros()
+        binary.data = np.ones_like(binary.data, dtype=np.float32)
+        return cls(binary, feature_names)
+
+    def save(self, path):
+        csc = self.doc_term
+        np.savez(path, data=csc.data, indices=csc.indices, indptr=csc.indptr, shape=np.asarray(csc.shape),
+                 feature_names=np.asarray(self.feature_names, dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as cache:
+            doc_term = csc_matrix((cache["data"], cache["indices"], cache["indptr"]), shape=tuple(cache["shape"]))
+            return cls(doc_term, cache["feature_names"])
+
+    def topic_ids(self, topics, top_n=10):
+        """Topics (lists of words or of vocabulary ids) as a T x top_n id array, -1 where the
+        word is unknown to the index or the topic is shorter."""
+        ids = np.full((len(topics), top_n), -1, dtype=int)
+        for t, words in enumerate(topics):
+            words = list(words)[:top_n]
+            ids[t, :len(words)] = [word if isinstance(word, (int, np.integer)) else self.word2id.get(str(word), -1)
+                                   for word in words]
+        return ids
+
+    def counts(self, word_ids):
+        """Document frequencies and the co-occurrence matrix of the given words (one sparse product)."""
+        columns = self.doc_term[:, word_ids]
+        co_doc = (columns.T @ columns).toarray()
+        return np.diag(co_doc).copy(), co_doc
+
+
+def build_cooccurrence_index(V, feature_names, cache_path=None):
+    """Loads the index from cache_path when it exists, otherwise builds it from V (and caches it)."""
+    if cache_path and os.path.exists(cache_path):
+        return CooccurrenceIndex.load(cache_path)
+    index = CooccurrenceIndex.from_matrix(V, feature_names)
+    if cache_path:
+        index.save(cache_path)
+    return index
+
+
+def topic_coherence(index, topics_by_model, top_n=10, measure='npmi'):
+    """Per-topic coherence of the top_n words of every topic of every model.
+
+    topics_by_model maps a model name to its topics (lists of words or vocabulary ids).
+    All models share one co-occurrence computation over the union of their top words, and
+    the pairwise scores are gathered with array indexing. measure is 'npmi' (mean over word
+    pairs, -1 for pairs that never co-occur) or 'umass' (Mimno et al., ranked pairs).
+    Returns {model: array of per-topic scores}; pairs with unknown words are skipped.
+    """
+    if measure not in ('npmi', 'umass'):
+        raise ValueError(f"unknown coherence measure {measure!r}, expected 'npmi' or 'umass'")
+    ids = {name: index.topic_ids(topics, top_n) for name, topics in topics_by_model.items()}
+    all_ids = np.concatenate([topic_ids.ravel() for topic_ids in ids.values()] + [np.zeros(0, dtype=int)])
+    vocabulary = np.unique(all_ids[all_ids >= 0])
+    doc_freq, co_doc = index.counts(vocabulary)
+    n_docs = float(index.n_docs)
+
+    i_idx, j_idx = np.triu_indices(top_n, k=1)
+    scores = {}
+    for name, topic_ids in ids.items():
+        local = np.searchsorted(vocabulary, np.maximum(topic_ids, 0))
+        # words ranked higher come first, so (i, j) with i < j pairs w_j against the earlier w_i
+        wi, wj = local[:, i_idx], local[:, j_idx]
+        valid = (topic_ids[:, i_idx] >= 0) & (topic_ids[:, j_idx] >= 0)
+        joint = co_doc[wi, wj]
+        if measure == 'npmi':
+            p_joint = joint / n_docs
+            p_i, p_j = doc_freq[wi] / n_docs, doc_freq[wj] / n_docs
+            with np.errstate(divide='ignore', invalid='ignore'):
+                pair = np.log(p_joint / (p_i * p_j)) / -np.log(p_joint)
+            pair = np.where(joint == 0, -1.0, np.where(p_joint >= 1, 1.0, pair))
+        else:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                pair = np.log((joint + 1.0) / doc_freq[wi])
+        pair = np.where(valid, pair, 0.0)
+        n_valid = valid.sum(axis=1)
+        scores[name] = np.where(n_valid > 0, pair.sum(axis=1) / np.maximum(n_valid, 1), np.nan)
+    return scores
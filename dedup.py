@@ -0,0 +1,109 @@
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse import csr_matrix
+
+# Mersenne prime for the universal hash family used by MinHash; a * word stays below 2**62
+_MINHASH_PRIME = (1 << 31) - 1
+
+
+def exact_duplicate_labels(V, random_state=0):
+    """Cluster label per row, rows with identical TF-IDF vectors share a label.
+
+    Rows are hashed with two random projections plus their nonzero count, then grouped
+    with np.unique, so the whole corpus is labelled without a Python loop over documents.
+    """
+    V = csr_matrix(V)
+    rng = np.random.RandomState(random_state)
+    projections = rng.uniform(0.5, 1.5, size=(V.shape[1], 2))
+    keys = np.column_stack([V @ projections, np.diff(V.indptr)])
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    return labels.ravel()
+
+
+def minhash_signatures(V, n_perm=64, random_state=0):
+    """MinHash signature (n_docs x n_perm) of the set of words present in each row."""
+    V = csr_matrix(V)
+    rng = np.random.RandomState(random_state)
+    a = rng.randint(1, _MINHASH_PRIME, size=n_perm).astype(np.uint64)
+    b = rng.randint(0, _MINHASH_PRIME, size=n_perm).astype(np.uint64)
+    words = V.indices.astype(np.uint64)
+    signatures = np.full((V.shape[0], n_perm), np.iinfo(np.uint64).max, dtype=np.uint64)
+    non_empty = np.flatnonzero(np.diff(V.indptr))
+    if V.nnz:
+        starts = V.indptr[non_empty]
+        # one permutation at a time keeps the temporary at nnz entries
+        for p in range(n_perm):
+            word_hashes = (a[p] * words + b[p]) % np.uint64(_MINHASH_PRIME)
+            signatures[non_empty, p] = np.minimum.reduceat(word_hashes, starts)
+    return signatures
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_labels(V, threshold=0.8, n_perm=64, n_bands=16, random_state=0):
+    """Cluster label per row, rows whose estimated word-set Jaccard similarity is at least
+    `threshold` share a label (MinHash + LSH banding, candidates verified on the signature)."""
+    if n_perm % n_bands:
+        raise ValueError(f"n_perm ({n_perm}) must be a multiple of n_bands ({n_bands})")
+    signatures = minhash_signatures(V, n_perm, random_state)
+    n_docs = signatures.shape[0]
+    rows_per_band = n_perm // n_bands
+    parent = np.arange(n_docs)
+    for band in range(n_bands):
+        band_keys = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+        _, bucket = np.unique(band_keys, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind='stable')
+        # only buckets holding more than one document produce candidate pairs
+        starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+        sizes = np.diff(np.r_[starts, n_docs])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            members = order[start:start + size]
+            head = members[0]
+            similarity = (signatures[members[1:]] == signatures[head]).mean(axis=1)
+            for member in members[1:][similarity >= threshold]:
+                root_head, root_member = _find(parent, head), _find(parent, member)
+                if root_head != root_member:
+                    parent[root_member] = root_head
+    roots = np.array([_find(parent, i) for i in range(n_docs)])
+    _, labels = np.unique(roots, return_inverse=True)
+    return labels.ravel()
+
+
+def collapse_rows(V, labels):
+    """Collapses rows sharing a label into their mean row.
+
+    Returns (V_unique, sample_weight, inverse): sample_weight[c] is the size of cluster c
+    and V_unique[inverse] approximates V (exactly, for exact duplicates).
+    """
+    V = csr_matrix(V)
+    inverse = np.asarray(labels).ravel()
+    n_clusters = inverse.max() + 1 if inverse.size else 0
+    membership = csr_matrix((np.ones(V.shape[0]), (inverse, np.arange(V.shape[0]))), shape=(n_clusters, V.shape[0]))
+    sample_weight = np.bincount(inverse, minlength=n_clusters).astype(float)
+    V_unique = sp.diags(1.0 / sample_weight) @ (membership @ V)
+    return csr_matrix(V_unique), sample_weight, inverse
+
+
+def deduplicate(V, near_duplicates=False, threshold=0.8, n_perm=64, n_bands=16, random_state=0):
+    """Exact (and optionally near-duplicate) collapsing of the rows of V.
+
+    Returns (V_unique, sample_weight, inverse); train on V_unique with
+    sample_weight=sample_weight and expand the document-topic matrix with W[inverse].
+    """
+    V = csr_matrix(V)
+    V_unique, sample_weight, inverse = collapse_rows(V, exact_duplicate_labels(V, random_state))
+    if near_duplicates and V_unique.shape[0] > 1:
+        # cluster the exact-unique rows, then compose both mappings
+        labels = near_duplicate_labels(V_unique, threshold, n_perm, n_bands, random_state)
+        n_clusters = labels.max() + 1
+        membership = csr_matrix((sample_weight, (labels, np.arange(len(labels)))), shape=(n_clusters, len(labels)))
+        cluster_weight = np.bincount(labels, weights=sample_weight, minlength=n_clusters)
+        V_unique = csr_matrix(sp.diags(1.0 / cluster_weight) @ (membership @ V_unique))
+        sample_weight, inverse = cluster_weight, labels[inverse]
+    return V_unique, sample_weight, inverse
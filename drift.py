@@ -0,0 +1,295 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix, issparse
+
+from OurAlgorithm import EPSILON, build_seed_mask, fold_in, load_model, normalize, train
+from report import write_table
+from vocabulary import seed_group_indices, seed_index_arrays
+
+
+def _dense(H):
+    return H.toarray() if issparse(H) else np.asarray(H, dtype=float)
+
+
+def topic_js(H_a, H_b):
+    """JS divergence between topic t of H_a and topic t of H_b (rows normalized to sum 1), a k-vector."""
+    P = H_a / np.maximum(H_a.sum(axis=1, keepdims=True), EPSILON)
+    Q = H_b / np.maximum(H_b.sum(axis=1, keepdims=True), EPSILON)
+    mix = P + Q
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 2p / (p + q) rather than p / m, which underflows for subnormal weights
+        kl_p = np.where(P > 0, P * np.log(2 * P / mix), 0.0).sum(axis=1)
+        kl_q = np.where(Q > 0, Q * np.log(2 * Q / mix), 0.0).sum(axis=1)
+    return np.maximum(0.5 * (kl_p + kl_q), 0)
+
+
+def seed_share(H, seed_mask, guided):
+    """Share of each topic's mass on its seed words, NaN for unguided topics."""
+    share = np.asarray(seed_mask.multiply(H).sum(axis=1)).ravel() / np.maximum(H.sum(axis=1), EPSILON)
+    return np.where(guided, share, np.nan)
+
+
+def align_topics(H_previous, H_new, guided):
+    """Permutation p with H_new[p[t]] the topic matching H_previous[t]: one assignment on the
+    cosine similarity of all topic pairs. Guided topics are tied to their seed constraints and
+    keep their index; only the unguided topics are matched."""
+    permutation = np.arange(H_new.shape[0])
+    free = np.flatnonzero(~guided)
+    if len(free):
+        similarity = normalize(H_previous[free]) @ normalize(H_new[free]).T
+        rows, cols = linear_sum_assignment(similarity, maximize=True)
+        permutation[free[rows]] = free[cols]
+    return permutation
+
+
+def topic_mass(W, H):
+    """Mass of each topic in W H (column sums of W times row sums of H), free of the W / H scaling."""
+    return np.nan_to_num(np.asarray(W.sum(axis=0)).ravel() * np.asarray(H.sum(axis=1)).ravel())
+
+
+class DriftTracker:
+    """Topics of successive time slices, each fitted on its slice only, warm-started from the
+    tracked topics.
+
+    A slice does not replace the tracked topics, it is accumulated into them: every topic keeps
+    a mass decayed by `decay` per slice, and the slice's fit of the topic is blended in with
+    weight slice mass / (decayed mass + slice mass); only the word distribution is blended, the
+    row keeps its scale (the slice's W absorbs any other). Topics below min_prevalence of the slice (by fold-in) are left out of
+    the slice's fit and keep their row unchanged, so minority topics survive slices that do not
+    mention them.
+
+    Only the initial H and one sparse delta (plus k row scales) per slice are kept: entries
+    moving by less than delta_tol of their topic's mass are dropped, and every delta is taken against the
+    reconstructed previous H, so the error stays bounded instead of accumulating. Per slice
+    the tracker records the topic permutation of the alignment, the JS divergence of every
+    tracked topic against the previous slice, the seed share of the guided topics and its
+    change, the topic prevalence in the slice's documents, the blend weight and the final KL.
+    """
+
+    per_topic = ("js", "seed_share", "seed_share_change", "prevalence", "weight")
+
+    def __init__(self, H, delta_tol=1e-4, decay=0.8, min_prevalence=1e-3, mass=None):
+        self.H_initial = _dense(H)
+        self.delta_tol = delta_tol
+        self.decay = decay
+        self.min_prevalence = min_prevalence
+        # None until the first slice, which then counts the initial topics as one average slice
+        self.mass = mass
+        self.H = self.H_initial.copy()
+        self.labels, self.deltas, self.permutations, self.row_scales = [], [], [], []
+        self.metrics = {name: [] for name in self.per_topic + ("kl", "n_documents")}
+
+    @property
+    def n_topics(self):
+        return self.H.shape[0]
+
+    @staticmethod
+    def _step(H, delta, row_scale):
+        # the only way H moves, so a loaded tracker reconstructs exactly the same H
+        return np.maximum(H + delta.toarray(), 0) * row_scale[:, np.newaxis]
+
+    def _apply(self, delta, row_scale):
+        self.H = self._step(self.H, delta, row_scale)
+
+    def update(self, label, V, seed_indices, MH_indices, W_max, theta_min, max_iter=10, fold_in_iter=30,
+               verbose=True, **train_kwargs):
+        """Fits the slice V (rows in the model's vocabulary) for max_iter iterations from the
+        tracked topics, accumulates it into them and records it under `label`.
+        Returns the slice's own fit (W, H), aligned to the tracked topics; topics left out of
+        the fit keep their fold-in W and tracked H."""
+        start = time.time()
+        k = self.n_topics
+        seed_mask, guided = build_seed_mask(seed_indices, MH_indices, k, self.H.shape[1])
+        # multiplicative updates cannot move exact zeros, pruned words get a chance to return
+        H_init = np.maximum(self.H, EPSILON)
+        W = fold_in(V, H_init, max_iter=fold_in_iter)
+        H = H_init.copy()
+        mass = topic_mass(W, H_init)
+        active = np.flatnonzero(mass >= self.min_prevalence * max(mass.sum(), EPSILON))
+        kl_losses = [np.nan]
+        if len(active):
+            # topics (nearly) absent from the slice would collapse in its fit, only the others are fitted
+            slice_seeds = {int(j): seed_mask[t].indices for j, t in enumerate(active) if guided[t]}
+            with contextlib.redirect_stdout(io.StringIO()):
+                W_fit, H_fit, kl_losses = train(V, len(active), None, W_max, None, slice_seeds, theta_min, max_iter,
+                                                W_init=W[:, active], H_init=H_init[active], **train_kwargs)
+            H_fit = _dense(H_fit)
+            finite = np.isfinite(H_fit).all(axis=1) & np.isfinite(W_fit).all(axis=0)
+            active, W_fit, H_fit = active[finite], W_fit[:, finite], H_fit[finite]
+            W[:, active], H[active] = W_fit, H_fit
+            mass[active] = topic_mass(W_fit, H_fit)
+        permutation = align_topics(self.H, H, guided)
+        W, H, mass = W[:, permutation], H[permutation], mass[permutation]
+        fitted = np.isin(permutation, active)
+
+        if self.mass is None:
+            self.mass = np.full(k, mass.mean())
+        carried = self.decay * self.mass
+        weight = np.where(fitted, mass / np.maximum(carried + mass, EPSILON), 0.0)
+        self.mass = carried + mass
+        # W and H only share a scale, so rows keep the tracked scale and only their word distribution moves
+        scale = self.H.sum(axis=1, keepdims=True)
+        target = (1 - weight[:, np.newaxis]) * self.H + weight[:, np.newaxis] * scale * H / np.maximum(
+            H.sum(axis=1, keepdims=True), EPSILON)
+
+        delta = target - self.H
+        delta[np.abs(delta) < self.delta_tol * target.sum(axis=1, keepdims=True)] = 0
+        delta = csr_matrix(delta.astype(np.float32))
+        # the dropped entries are mostly small decreases, the row scale restores the topic's mass
+        row_sums = np.maximum(self.H + delta.toarray(), 0).sum(axis=1)
+        row_scale = np.where(row_sums > 0, target.sum(axis=1) / np.maximum(row_sums, EPSILON), 1.0)
+        previous = self.H
+        self._apply(delta, row_scale)
+
+        self.labels.append(str(label))
+        self.deltas.append(delta)
+        self.permutations.append(permutation)
+        self.row_scales.append(row_scale)
+        self.metrics["js"].append(topic_js(previous, self.H))
+        self.metrics["seed_share"].append(seed_share(self.H, seed_mask, guided))
+        self.metrics["seed_share_change"].append(self.metrics["seed_share"][-1] - seed_share(previous, seed_mask, guided))
+        self.metrics["prevalence"].append(mass / max(mass.sum(), EPSILON))
+        self.metrics["weight"].append(weight)
+        self.metrics["kl"].append(float(kl_losses[-1]))
+        self.metrics["n_documents"].append(V.shape[0])
+        if verbose:
+            print(f"Slice {label}: {V.shape[0]} documents, {fitted.sum()} of {k} topics fitted, KL {kl_losses[-1]:.6g}, "
+                  f"max topic JS {self.metrics['js'][-1].max():.4g}, delta {delta.nnz} of {H.size} entries, "
+                  f"{time.time() - start:.2f}s")
+        return W, H
+
+    def H_at(self, label):
+        """Reconstructed topics after the slice `label`."""
+        H = self.H_initial.copy()
+        for slice_label, delta, row_scale in zip(self.labels, self.deltas, self.row_scales):
+            H = self._step(H, delta, row_scale)
+            if slice_label == str(label):
+                return H
+        raise KeyError(label)
+
+    def drift_table(self):
+        """One row per (slice, topic): js against the previous slice, seed_share and its change,
+        prevalence, and source_topic, the topic index in that slice's own fit."""
+        k, n_slices = self.n_topics, len(self.labels)
+
+        def column(name):
+            return np.concatenate(self.metrics[name]) if n_slices else np.zeros(0)
+
+        return pd.DataFrame({
+            "slice": np.repeat(np.asarray(self.labels, dtype=str), k),
+            "topic": np.tile(np.arange(k), n_slices),
+            "js": column("js"),
+            "seed_share": column("seed_share"),
+            "seed_share_change": column("seed_share_change"),
+            "prevalence": column("prevalence"),
+            "weight": column("weight"),
+            "source_topic": np.concatenate(self.permutations) if n_slices else np.zeros(0, dtype=int),
+        })
+
+    def save(self, path):
+        arrays = {}
+        for t, delta in enumerate(self.deltas):
+            arrays.update({f"delta{t}_data": delta.data, f"delta{t}_indices": delta.indices,
+                           f"delta{t}_indptr": delta.indptr})
+        k = self.n_topics
+        for name, values in self.metrics.items():
+            arrays[name] = np.asarray(values) if values else np.zeros((0, k) if name in self.per_topic else 0)
+        if self.mass is not None:
+            arrays["mass"] = self.mass
+        np.savez(path, H_initial=self.H_initial, delta_tol=self.delta_tol, decay=self.decay,
+                 min_prevalence=self.min_prevalence, labels=np.asarray(self.labels, dtype=str),
+                 permutations=np.asarray(self.permutations, dtype=int).reshape(-1, k),
+                 row_scales=np.asarray(self.row_scales, dtype=float).reshape(-1, k), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as cache:
+            tracker = cls(cache["H_initial"], float(cache["delta_tol"]), float(cache["decay"]),
+                          float(cache["min_prevalence"]), cache["mass"] if "mass" in cache else None)
+            shape = tracker.H.shape
+            for t, label in enumerate(cache["labels"].tolist()):
+                delta = csr_matrix((cache[f"delta{t}_data"], cache[f"delta{t}_indices"], cache[f"delta{t}_indptr"]),
+                                   shape=shape)
+                tracker._apply(delta, cache["row_scales"][t])
+                tracker.labels.append(label)
+                tracker.deltas.append(delta)
+                tracker.permutations.append(cache["permutations"][t])
+                tracker.row_scales.append(cache["row_scales"][t])
+            for name in tracker.metrics:
+                tracker.metrics[name] = list(cache[name])
+        return tracker
+
+
+def time_slices(data, time_column, freq='D'):
+    """(label, rows) per period of data[time_column] (pandas frequency such as 'D', 'W', 'M'), in time order."""
+    periods = pd.to_datetime(data[time_column]).dt.to_period(freq)
+    return [(str(period), rows) for period, rows in data.groupby(periods, sort=True)]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Topic drift across time slices, each fitted warm-started from the previous one")
+    parser.add_argument('--data_path', type=str, required=True, help="Dataset with a text and a timestamp column (CSV format)")
+    parser.add_argument('--model_path', type=str, required=True, help="Model saved by script-run.py --model_path: vocabulary and initial topics")
+    parser.add_argument('--drift_path', type=str, default='./drift.npz', help="Drift state (.npz); existing slices are not refitted")
+    parser.add_argument('--output_path', type=str, default='./drift', help="Drift table path, without extension")
+    parser.add_argument('--output_format', type=str, default='jsonl', choices=['jsonl', 'parquet'], help="Format of the drift table")
+    parser.add_argument('--text_column', type=str, default='Sentence', help="Column holding the documents")
+    parser.add_argument('--time_column', type=str, default='date', help="Column holding the timestamps")
+    parser.add_argument('--freq', type=str, default='D', help="Slice length as a pandas period frequency (D, W, M)")
+    parser.add_argument('--seed_words_path', type=str, default=None, help="Seed words, one per line, shared by the MH_indices topics")
+    parser.add_argument('--seed_groups', type=str, default=None, help="JSON file mapping topic index to its own list of seed words (overrides MH_indices)")
+    parser.add_argument('--MH_indices', type=int, nargs='+', default=[0, 1, 2, 3, 4, 5, 6, 7], help="List of Mental Health indices")
+    parser.add_argument('--W_max', type=float, default=1e-9, help="Max value for W")
+    parser.add_argument('--theta_min', type=float, default=0.4, help="Min value for theta")
+    parser.add_argument('--max_iteration', type=int, default=10, help="Iterations per slice")
+    parser.add_argument('--delta_tol', type=float, default=1e-4, help="Drop topic changes below this share of the topic's mass from the stored deltas")
+    parser.add_argument('--decay', type=float, default=0.8, help="Per-slice decay of the accumulated topic mass (1: every slice weighs the same)")
+    parser.add_argument('--min_prevalence', type=float, default=1e-3, help="Topics below this share of a slice are not refitted on it")
+    parser.add_argument('--random_state', type=int, default=None, help="Seed of the training runs")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    H, vectorizer = load_model(args.model_path)
+    feature_names = vectorizer.get_feature_names_out()
+    # a loaded model is a SavedTfidfVectorizer or a TfidfVectorizer, both expose their params
+    lowercase = vectorizer.get_params().get("lowercase", True)
+    seed_indices, missing_seed_words = [], []
+    if args.seed_groups:
+        with open(args.seed_groups, encoding='utf-8') as f:
+            seed_indices, missing_seed_words = seed_group_indices(feature_names, json.load(f), lowercase)
+    elif args.seed_words_path:
+        with open(args.seed_words_path, encoding='utf-8') as f:
+            seed_indices, _, missing_seed_words = seed_index_arrays(
+                feature_names, [line.strip() for line in f if line.strip()], lowercase)
+    if missing_seed_words:
+        print(f"Seed words missing from the model vocabulary: {', '.join(missing_seed_words)}")
+    if os.path.exists(args.drift_path):
+        tracker = DriftTracker.load(args.drift_path)
+    else:
+        tracker = DriftTracker(H, args.delta_tol, args.decay, args.min_prevalence)
+    data = pd.read_csv(args.data_path)
+    done = set(tracker.labels)
+    for label, rows in time_slices(data, args.time_column, args.freq):
+        if label in done:
+            continue
+        V = vectorizer.transform(rows[args.text_column].astype(str))
+        tracker.update(label, V, seed_indices, args.MH_indices, args.W_max, args.theta_min, args.max_iteration,
+                       random_state=args.random_state)
+    tracker.save(args.drift_path)
+    write_table(tracker.drift_table(), args.output_path, args.output_format)
+    print(f"{len(tracker.labels)} slices tracked, drift state saved to {args.drift_path}, "
+          f"table to {args.output_path}.{args.output_format}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from OurAlgorithm import heldout_kl, load_model
+
+
+def split_documents(V, heldout_fraction=0.1, random_state=0):
+    """Random document split, returns (train_rows, heldout_rows)."""
+    rng = np.random.RandomState(random_state)
+    order = rng.permutation(V.shape[0])
+    n_heldout = int(round(heldout_fraction * V.shape[0]))
+    return np.sort(order[n_heldout:]), np.sort(order[:n_heldout])
+
+
+def vectorized_csv_chunks(path, vectorizer, text_column='Sentence', chunk_size=10000):
+    """Reads a CSV chunk by chunk and yields TF-IDF row chunks, so a validation set of any
+    size is scored without loading it whole."""
+    for frame in pd.read_csv(path, usecols=[text_column], chunksize=chunk_size):
+        yield vectorizer.transform(frame[text_column].astype(str))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Held-out KL of a saved model on a validation CSV")
+    parser.add_argument('--model_path', type=str, required=True, help="Model file written by script-run.py --model_path")
+    parser.add_argument('--data_path', type=str, required=True, help="Validation dataset (CSV format)")
+    parser.add_argument('--text_column', type=str, default='Sentence', help="Column holding the documents")
+    parser.add_argument('--chunk_size', type=int, default=10000, help="Documents read, folded in and scored at a time")
+    parser.add_argument('--completion_fraction', type=float, default=None, help="Score document completion: hide this share of each document's words")
+    parser.add_argument('--fold_in_iter', type=int, default=30, help="Iterations of the fold-in W solve")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    H, vectorizer = load_model(args.model_path)
+    chunks = vectorized_csv_chunks(args.data_path, vectorizer, args.text_column, args.chunk_size)
+    score = heldout_kl(chunks, H, fold_in_iter=args.fold_in_iter, completion_fraction=args.completion_fraction)
+    kind = "document completion KL" if args.completion_fraction is not None else "held-out KL"
+    print(f"{kind}: {score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import contextlib
+import io
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from OurAlgorithm import (EPSILON, _canonical_csr, _special_sparse_dot, build_seed_mask, doc_seed_presence, heldout_kl,
+                          train)
+from heldout import split_documents
+
+
+def topic_residuals(V, W, H):
+    """Share of the KL residual attributed to each topic.
+
+    Every nonzero's KL term is split over the topics in proportion to W_ik H_kj / (WH)_ij,
+    which is one masked product and one sparse-dense product for all topics at once.
+    """
+    V = _canonical_csr(V)
+    WH_data = _special_sparse_dot(W, H, V).data
+    WH_data[WH_data < EPSILON] = EPSILON
+    V_data = np.maximum(V.data, EPSILON)
+    residual = V_data * np.log(V_data / WH_data) - V_data + WH_data
+    R = csr_matrix((residual / WH_data, V.indices, V.indptr), shape=V.shape)
+    return np.asarray((W * (R @ H.T)).sum(axis=0)).ravel()
+
+
+def split_topic(W, H, topic, rng, noise=0.1):
+    """Appends a copy of `topic` to W and H; both halves share its document weight and
+    their word weights are perturbed in opposite directions so they can separate."""
+    perturbation = 1 + noise * rng.uniform(-1, 1, size=H.shape[1])
+    new_row = H[topic] * perturbation
+    H = np.vstack([H, new_row])
+    H[topic] = H[topic] * (2 - perturbation)
+    W = np.hstack([W, W[:, [topic]] / 2])
+    W[:, topic] /= 2
+    return W, H
+
+
+def seed_satisfaction(H, seed_mask, guided, theta_min):
+    """g2: share of guided topics whose seed mass reaches theta_min, and the mean mass.
+    (g1 is not reported: train clamps W at W_max on its pairs, so it always holds.)"""
+    if not guided.any():
+        return {"seed_share_mean": None, "g2_satisfied": None}
+    seed_share = np.asarray(seed_mask.multiply(H).sum(axis=1)).ravel() / np.maximum(H.sum(axis=1), EPSILON)
+    return {
+        "seed_share_mean": float(seed_share[guided].mean()),
+        "g2_satisfied": float((seed_share[guided] >= theta_min).mean()),
+    }
+
+
+def elbow_index(ks, values):
+    """Index of the knee of a decreasing curve values(ks) (Kneedle): the point lying furthest
+    below the chord joining its end points, after scaling both axes to [0, 1]. 0 when the
+    curve is flat or has fewer than three points."""
+    ks, values = np.asarray(ks, dtype=float), np.asarray(values, dtype=float)
+    if len(values) < 3 or values[0] == values[-1]:
+        return 0
+    y = (values - values[-1]) / (values[0] - values[-1])
+    chord = (ks[-1] - ks) / (ks[-1] - ks[0])
+    return int(np.argmax(chord - y))
+
+
+def select_n_topics(V, n_topics_range, MH_indices, W_max, seed_indices, theta_min, max_iter=40,
+                    warm_iter=None, heldout_fraction=0.1, random_state=0, fold_in_iter=30, init='random',
+                    completion_fraction=0.5, zero_seed_indices=None, verbose=True):
+    """Model-order search over n_topics_range (ascending).
+
+    The smallest k is fitted from scratch; every larger k is warm-started from the previous
+    solution by repeatedly splitting the topic with the largest KL residual and then refined
+    for warm_iter iterations (default max_iter // 4). The seed mask and document seed
+    presence are built once for the largest k and sliced for the others, and guided topics
+    must therefore be lower than the smallest k. random_state seeds the split, the first
+    fit's initialization (`init`) and the topic splits. zero_seed_indices is passed to train
+    like in the final fit (legacy g1 documents, given as rows of V), so k is chosen under the
+    same constraints.
+    Returns (report, models): one dict per k with training KL, held-out KL and seed-constraint
+    satisfaction, and k -> (W, H). The held-out KL is document completion: completion_fraction
+    of each held-out document's words is hidden, W is folded in on the rest (fold_in_iter
+    iterations for every k) and the hidden words are scored. See best_n_topics for the choice.
+    """
+    ks = sorted(n_topics_range)
+    if warm_iter is None:
+        warm_iter = max(1, max_iter // 4)
+    V = csr_matrix(V)
+    train_rows, heldout_rows = split_documents(V, heldout_fraction, random_state)
+    if not len(heldout_rows):
+        raise ValueError(f"heldout_fraction={heldout_fraction} leaves no held-out documents to select n_topics on")
+    V_train, V_heldout = V[train_rows], V[heldout_rows]
+    if zero_seed_indices is not None:
+        # legacy g1 documents are rows of V; keep those in the training split, renumbered
+        zero_seed_indices = np.flatnonzero(np.isin(train_rows, np.asarray(list(zero_seed_indices), dtype=int)))
+    seed_mask, guided = build_seed_mask(seed_indices, MH_indices, ks[-1], V.shape[1])
+    if guided.nonzero()[0].max(initial=-1) >= ks[0]:
+        raise ValueError(f"guided topics must be below the smallest n_topics ({ks[0]})")
+    seed_presence = doc_seed_presence(V_train, seed_mask)
+    guided_seeds = {int(k): seed_mask[k].indices for k in np.flatnonzero(guided)}
+
+    rng = np.random.RandomState(random_state)
+    init_rng = np.random.default_rng(random_state)
+    report, models = [], {}
+    W = H = None
+    for k in ks:
+        start = time.time()
+        if W is not None:
+            while H.shape[0] < k:
+                W, H = split_topic(W, H, int(np.argmax(topic_residuals(V_train, W, H))), rng)
+        with contextlib.redirect_stdout(io.StringIO()):
+            W, H, kl_losses = train(V_train, k, None, W_max, zero_seed_indices, guided_seeds, theta_min,
+                                    max_iter if W is None else warm_iter, W_init=W, H_init=H,
+                                    seed_presence=seed_presence[:, :k], random_state=init_rng, init=init)
+        row = {
+            "n_topics": k,
+            "kl": float(kl_losses[-1]),
+            "heldout_kl": float(heldout_kl(V_heldout, H, fold_in_iter=fold_in_iter,
+                                           completion_fraction=completion_fraction, random_state=random_state)),
+            "iterations": len(kl_losses) - 1,
+            "seconds": time.time() - start,
+        }
+        row.update(seed_satisfaction(H, seed_mask[:k], guided[:k], theta_min))
+        report.append(row)
+        models[k] = (W, H)
+        if verbose:
+            print(f"n_topics={k}: KL {row['kl']:.6g}, held-out KL {row['heldout_kl']}, "
+                  f"seed share {row['seed_share_mean']}, {row['seconds']:.2f}s")
+    return report, models
+
+
+def best_n_topics(report, criterion='elbow'):
+    """n_topics chosen from a select_n_topics report.
+
+    'elbow' (default) takes the knee of the training KL curve (see elbow_index): the k after
+    which more topics stop paying for themselves. 'heldout' takes the lowest held-out
+    completion KL, ignoring rows without a score; on small corpora that score tends to rise
+    with k and then always picks the smallest candidate."""
+    if criterion == 'elbow':
+        report = sorted(report, key=lambda row: row["n_topics"])
+        return report[elbow_index([row["n_topics"] for row in report], [row["kl"] for row in report])]["n_topics"]
+    if criterion != 'heldout':
+        raise ValueError(f"unknown criterion {criterion!r}, expected 'elbow' or 'heldout'")
+    scored = [row for row in report if row["heldout_kl"] is not None and not np.isnan(row["heldout_kl"])]
+    if not scored:
+        raise ValueError("no n_topics has a held-out KL to select on")
+    return min(scored, key=lambda row: row["heldout_kl"])["n_topics"]
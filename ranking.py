@@ -0,0 +1,63 @@
+import multiprocessing
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from retrieval import js_divergence_matrix
+
+_worker_H = None
+
+
+def _init_worker(H):
+    # H is sent once per worker instead of once per shard
+    global _worker_H
+    _worker_H = H
+
+
+def shard_top_documents(V, H, start, n_top):
+    """Per-topic top n_top documents of one shard of rows (lowest JS divergence first), as
+    (ids, scores) arrays of shape k x min(n_top, shard size); ids are offset by start."""
+    js = js_divergence_matrix(V, H, n_jobs=1).T
+    n = min(n_top, js.shape[1])
+    if n < js.shape[1]:
+        part = np.argpartition(js, n - 1, axis=1)[:, :n]
+    else:
+        part = np.broadcast_to(np.arange(js.shape[1]), js.shape).copy()
+    scores = np.take_along_axis(js, part, axis=1)
+    return part + start, scores
+
+
+def merge_top_documents(partials, n_top):
+    """Merges per-topic partial top-N lists [(ids, scores), ...] into one, ordered by score
+    and then by document id so the result does not depend on the sharding."""
+    ids = np.concatenate([partial[0] for partial in partials], axis=1)
+    scores = np.concatenate([partial[1] for partial in partials], axis=1)
+    order = np.lexsort((ids, scores), axis=1)[:, :n_top] if ids.size else ids
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _rank_shard(task):
+    V, start, n_top = task
+    return shard_top_documents(V, _worker_H, start, n_top)
+
+
+def rank_documents_sharded(V, H, n_top=10, shard_size=20000, workers=None):
+    """Top n_top documents per topic by JS divergence between the document (row of V) and the
+    topic (row of H), both normalized to sum 1: {topic: document ids, best first}.
+
+    Row shards of shard_size documents are ranked on `workers` processes (default: CPU
+    count); each returns its per-topic partial top-N, and the partials are folded into a
+    running top-N as they arrive, so memory stays at one shard plus k x n_top per worker.
+    A corpus of a single shard, or workers=1, is ranked in-process."""
+    V = csr_matrix(V)
+    starts = range(0, V.shape[0], shard_size)
+    tasks = ((V[start:start + shard_size], start, n_top) for start in starts)
+    best = (np.zeros((H.shape[0], 0), dtype=int), np.zeros((H.shape[0], 0)))
+    if workers == 1 or len(starts) <= 1:
+        for shard, start, _ in tasks:
+            best = merge_top_documents([best, shard_top_documents(shard, H, start, n_top)], n_top)
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(H,)) as pool:
+            for partial in pool.imap_unordered(_rank_shard, tasks):
+                best = merge_top_documents([best, partial], n_top)
+    return {topic: ids for topic, ids in enumerate(best[0])}
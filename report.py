@@ -0,0 +1,81 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def topic_highlighter(top_words):
+    """One compiled pattern matching any of the topic's words as a whole token (case-insensitive,
+    like the vectorizer's lowercased tokens); longer words first so prefixes never win."""
+    words = sorted({str(word) for word in top_words}, key=len, reverse=True)
+    if not words:
+        return None
+    return re.compile(r'\b(' + '|'.join(map(re.escape, words)) + r')\b', re.IGNORECASE)
+
+
+def highlight_top_words(document, pattern):
+    if isinstance(document, list):  # Check if document is a list
+        document = ' '.join(document)  # Join list into a single string
+    if pattern is None:
+        return document
+    return pattern.sub(r'*\1*', document)
+
+
+def write_text_report(path, documents, topics, ranked_documents, n_top_docs=10):
+    """The human-readable report: top documents per topic with highlighted top words, then the topics.
+    Lines are collected and written in one call."""
+    lines = []
+    for topic_index, words in enumerate(topics):
+        document_indices = ranked_documents[topic_index][:n_top_docs]
+        lines.append(f"Top {n_top_docs} documents for Topic #{topic_index}:")
+        lines.append(f"{document_indices}")
+        pattern = topic_highlighter(word for word, _ in words)
+        for doc_index in document_indices:
+            lines.append(f"Document #{doc_index}: {highlight_top_words(documents[doc_index], pattern)}")
+    lines.append("\nGenerated Topics and Associated Documents:")
+    for topic_index, words in enumerate(topics):
+        lines.append(f"Topic #{topic_index}: {' - '.join(word for word, _ in words)}")
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def write_table(frame, path, fmt):
+    if fmt == 'parquet':
+        # needs pyarrow or fastparquet
+        frame.to_parquet(path + '.parquet', index=False)
+    else:
+        frame.to_json(path + '.jsonl', orient='records', lines=True, force_ascii=False)
+
+
+def write_structured_results(results_dir, topics, ranked_documents, W, n_top_docs=10, fmt='jsonl'):
+    """Writes three tables built from whole arrays, loadable without parsing the text report:
+
+    topics     (topic, rank, word, weight)   top words with their normalized weights
+    rankings   (topic, rank, document)       top n_top_docs documents per topic
+    documents  (document, topic, weight)     dominant topic and its share for every document
+    """
+    os.makedirs(results_dir, exist_ok=True)
+    n_words = [len(words) for words in topics]
+    write_table(pd.DataFrame({
+        "topic": np.repeat(np.arange(len(topics)), n_words),
+        "rank": np.concatenate([np.arange(n) for n in n_words] + [np.zeros(0, dtype=int)]),
+        "word": [word for words in topics for word, _ in words],
+        "weight": [float(weight) for words in topics for _, weight in words],
+    }), os.path.join(results_dir, 'topics'), fmt)
+
+    top = [np.asarray(ranked_documents[topic])[:n_top_docs] for topic in range(len(topics))]
+    write_table(pd.DataFrame({
+        "topic": np.repeat(np.arange(len(top)), [len(docs) for docs in top]),
+        "rank": np.concatenate([np.arange(len(docs)) for docs in top] + [np.zeros(0, dtype=int)]),
+        "document": np.concatenate(top + [np.zeros(0, dtype=int)]),
+    }), os.path.join(results_dir, 'rankings'), fmt)
+
+    W_sum = W.sum(axis=1)
+    W_sum[W_sum == 0] = 1
+    dominant = np.argmax(W, axis=1)
+    write_table(pd.DataFrame({
+        "document": np.arange(W.shape[0]),
+        "topic": dominant,
+        "weight": W[np.arange(W.shape[0]), dominant] / W_sum,
+    }), os.path.join(results_dir, 'documents'), fmt)
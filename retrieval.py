@@ -0,0 +1,190 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy.sparse import csr_matrix, issparse
+
+from OurAlgorithm import fold_in
+
+LOG2 = np.log(2.0)
+
+
+def _topic_distributions(H):
+    """Rows of H normalized to sum 1, dense (k x n)."""
+    H = H.toarray() if issparse(H) else np.asarray(H, dtype=float)
+    H_sum = H.sum(axis=1, keepdims=True)
+    H_sum[H_sum == 0] = 1
+    return H / H_sum
+
+
+def _js_block(V, Q_T):
+    """JS divergence of every row of V (csr, rows summing to 1) against every topic (columns
+    of Q_T, n x k). Only the nonzeros of each document are visited: where p is zero the
+    divergence gets q * log 2 / 2 from every word, i.e. log 2 / 2 * (1 - mass of q on the document's words)."""
+    p = V.data[:, np.newaxis]
+    q = Q_T[V.indices]
+    mix = p + q
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = p * np.log(2 * p / mix) + np.where(q > 0, q * np.log(2 * q / mix), 0.0)
+    per_document = csr_matrix((np.ones(V.nnz), np.arange(V.nnz), V.indptr), shape=(V.shape[0], V.nnz))
+    js = 0.5 * (per_document @ terms + LOG2 * (1 - per_document @ q))
+    js = np.maximum(js, 0)
+    js[np.diff(V.indptr) == 0] = np.inf
+    return js
+
+
+def js_divergence_matrix(V, H, chunk_nnz=2 ** 18, n_jobs=None):
+    """Jensen-Shannon divergence between every document (row of V, normalized to sum 1) and
+    every topic (row of H, normalized to sum 1), as an m x k array; empty documents score inf.
+
+    Batched over row chunks of about chunk_nnz nonzeros, computed on n_jobs threads."""
+    V = csr_matrix(V, dtype=float)
+    row_sums = np.asarray(V.sum(axis=1)).ravel()
+    row_sums[row_sums == 0] = 1
+    V = csr_matrix((V.data / np.repeat(row_sums, np.diff(V.indptr)), V.indices, V.indptr), shape=V.shape)
+    Q_T = np.ascontiguousarray(_topic_distributions(H).T)
+    k = Q_T.shape[1]
+    bounds, start = [], 0
+    rows_per_chunk = max(1, chunk_nnz // max(k, 1))
+    while start < V.shape[0]:
+        # chunks hold about chunk_nnz / k nonzeros, so the gathered nnz x k block stays bounded
+        stop = int(np.searchsorted(V.indptr, V.indptr[start] + rows_per_chunk, side='right')) - 1
+        stop = min(max(stop, start + 1), V.shape[0])
+        bounds.append((start, stop))
+        start = stop
+    js = np.empty((V.shape[0], k))
+    with ThreadPoolExecutor(n_jobs) as pool:
+        for (start, stop), block in zip(bounds, pool.map(lambda b: _js_block(V[b[0]:b[1]], Q_T), bounds)):
+            js[start:stop] = block
+    return js
+
+
+def topic_space(W):
+    """Rows of W scaled to unit length: the cosine between a document and topic t is column t."""
+    W = np.asarray(W, dtype=float)
+    norms = np.linalg.norm(W, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return W / norms
+
+
+class TopicIndex:
+    """Retrieval index over the document-topic space of a trained model.
+
+    Keeps, per topic, the documents sorted by JS divergence (ascending) and by cosine in topic
+    space (descending), so "documents most like topic t" is a prefix of a posting list and
+    "topics of document d" one row of the score matrices.
+
+    Documents added later (add_documents, fold_in_documents) go to a small buffer that every
+    query also scans; the buffer is merged into the posting lists once it holds merge_size rows.
+    """
+
+    measures = ('js', 'cosine')
+
+    def __init__(self, H, js, theta, merge_size=4096, n_jobs=None, postings=None):
+        self.H = H
+        self.n_jobs = n_jobs
+        self.merge_size = merge_size
+        self.scores = {"js": np.asarray(js, dtype=np.float32), "cosine": np.asarray(theta, dtype=np.float32)}
+        if postings is None:
+            postings = {measure: self._sorted_columns(scores, descending=measure == 'cosine')
+                        for measure, scores in self.scores.items()}
+        self.postings = postings
+        self.buffer = {measure: np.zeros((0, scores.shape[1]), dtype=np.float32) for measure, scores in self.scores.items()}
+
+    @classmethod
+    def build(cls, W, V, H, merge_size=4096, n_jobs=None):
+        return cls(H, js_divergence_matrix(V, H, n_jobs=n_jobs), topic_space(W), merge_size, n_jobs)
+
+    @property
+    def n_indexed(self):
+        return self.scores["js"].shape[0]
+
+    @property
+    def n_documents(self):
+        return self.n_indexed + self.buffer["js"].shape[0]
+
+    def _sorted_columns(self, scores, descending):
+        def column_order(t):
+            return np.argsort(-scores[:, t] if descending else scores[:, t], kind='stable').astype(np.int32)
+
+        with ThreadPoolExecutor(self.n_jobs) as pool:
+            columns = list(pool.map(column_order, range(scores.shape[1])))
+        return np.stack(columns) if columns else np.zeros((0, scores.shape[0]), dtype=np.int32)
+
+    @staticmethod
+    def _sign(measure):
+        if measure not in TopicIndex.measures:
+            raise ValueError(f"unknown measure {measure!r}, expected 'js' or 'cosine'")
+        # lower JS is closer, higher cosine is closer
+        return 1.0 if measure == 'js' else -1.0
+
+    def top_documents(self, topic, n=10, measure='js'):
+        """The n documents most like `topic`: lowest JS divergence or highest cosine.
+        Returns (document ids, scores)."""
+        sign = self._sign(measure)
+        indexed = self.postings[measure][topic, :n]
+        buffered = self.buffer[measure][:, topic]
+        nearest = np.argsort(sign * buffered, kind='stable')[:n]
+        candidates = np.concatenate([indexed, self.n_indexed + nearest])
+        scores = np.concatenate([self.scores[measure][indexed, topic], buffered[nearest]])
+        order = np.argsort(sign * scores, kind='stable')[:n]
+        return candidates[order], scores[order]
+
+    def top_topics(self, document, n=3, measure='js'):
+        """The n topics `document` matches best. Returns (topic ids, scores)."""
+        sign = self._sign(measure)
+        if document < self.n_indexed:
+            row = self.scores[measure][document]
+        else:
+            row = self.buffer[measure][document - self.n_indexed]
+        order = np.argsort(sign * row, kind='stable')[:n]
+        return order, row[order]
+
+    def add_documents(self, W_new, V_new):
+        """Indexes new documents from their fold-in weights; returns their ids."""
+        ids = np.arange(self.n_documents, self.n_documents + W_new.shape[0])
+        new = {"js": js_divergence_matrix(V_new, self.H, n_jobs=self.n_jobs), "cosine": topic_space(W_new)}
+        for measure, scores in new.items():
+            self.buffer[measure] = np.vstack([self.buffer[measure], scores.astype(np.float32)])
+        if self.buffer["js"].shape[0] >= self.merge_size:
+            self.merge()
+        return ids
+
+    def fold_in_documents(self, V_new, fold_in_iter=30):
+        """Folds new documents into the fixed topics and indexes them; returns (ids, W_new)."""
+        W_new = fold_in(V_new, self.H, max_iter=fold_in_iter)
+        return self.add_documents(W_new, V_new), W_new
+
+    def merge(self):
+        """Merges the buffered documents into the posting lists (one sorted insert per topic)."""
+        n_buffered = self.buffer["js"].shape[0]
+        if not n_buffered:
+            return
+        new_ids = np.arange(self.n_indexed, self.n_indexed + n_buffered)
+        for measure in self.measures:
+            sign, scores, buffered = self._sign(measure), self.scores[measure], self.buffer[measure]
+            merged = []
+            for t, postings in enumerate(self.postings[measure]):
+                order = np.argsort(sign * buffered[:, t], kind='stable')
+                positions = np.searchsorted(sign * scores[postings, t], sign * buffered[order, t], side='right')
+                merged.append(np.insert(postings, positions, new_ids[order]).astype(np.int32))
+            self.postings[measure] = np.stack(merged)
+            self.scores[measure] = np.vstack([scores, buffered])
+            self.buffer[measure] = buffered[:0]
+
+    def save(self, path):
+        self.merge()
+        H = self.H
+        arrays = ({"H_data": H.data, "H_indices": H.indices, "H_indptr": H.indptr, "H_shape": np.asarray(H.shape)}
+                  if issparse(H) else {"H": H})
+        np.savez(path, js=self.scores["js"], theta=self.scores["cosine"], js_postings=self.postings["js"],
+                 cosine_postings=self.postings["cosine"], **arrays)
+
+    @classmethod
+    def load(cls, path, merge_size=4096, n_jobs=None):
+        with np.load(path, allow_pickle=False) as cache:
+            if "H_data" in cache:
+                H = csr_matrix((cache["H_data"], cache["H_indices"], cache["H_indptr"]), shape=tuple(cache["H_shape"]))
+            else:
+                H = cache["H"]
+            postings = {"js": cache["js_postings"], "cosine": cache["cosine_postings"]}
+            return cls(H, cache["js"], cache["theta"], merge_size, n_jobs, postings)
@@ -1,60 +1,28 @@
 import argparse
+import json
 import numpy as np
 import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from OurAlgorithm import train
+from OurAlgorithm import train, train_restarts, save_model, top_k_per_topic
+from dedup import deduplicate
+from vocabulary import build_vocabulary, seed_group_indices
+from model_selection import best_n_topics, select_n_topics
+from report import write_structured_results, write_text_report
+from retrieval import TopicIndex
+from ranking import rank_documents_sharded
 import os
 
 
 
 
 
-def highlight_top_words(document, top_words):
-    if isinstance(document, list):  # Check if document is a list
-        document = ' '.join(document)  # Join list into a single string
-    highlighted = document
-    for word in top_words:
-        highlighted = highlighted.replace(word, f'*{word}*')  # Highlight the top words
-    return highlighted
-
-
-def kl_divergence(p, q):
-    log_q = np.where(q != 0, np.log(q), -1000)
-    Ip = np.where(p != 0)
-    return np.sum(p[Ip] * (np.log(p[Ip]) - log_q[Ip]))
-def jensen_shannon_divergence(p, q):
-    p = np.array(p)
-    q = np.array(q)
-    p = p / np.sum(p)
-    q = q / np.sum(q)
-    m = 0.5 * (p + q)
-    return 0.5 * kl_divergence(p, m) + 0.5 * kl_divergence(q, m)
-
-def rank_documents_by_custom_js(V, W, H):
-
-    n_topics = H.shape[0]
-    n_docs = W.shape[0]
-    ranked_docs = {}
-
-    for topic_index in range(n_topics):
-        topic_word_distribution = H[topic_index, :]
-        js_divergences = np.zeros(n_docs)
-
-        for doc_index in range(n_docs):
-            doc_word_distribution = V[doc_index, :].todense()
-            doc_word_distribution = np.array(doc_word_distribution).squeeze()
-            js_divergences[doc_index] = jensen_shannon_divergence(doc_word_distribution, topic_word_distribution)
-        ranked_docs[topic_index] = np.argsort(js_divergences)
-
-    return ranked_docs
 def get_topicsss(H, top_words, id2word):
     topic_list = []
-    for topic in H:
-        words_list = sorted(list(enumerate(topic)), key=lambda x: x[1], reverse=True)
-        topk = [tup[0] for tup in words_list[:top_words]]
-        topk_proportions = [tup[1] for tup in words_list[:top_words]]
-        topk_proportions = [x / sum(topk_proportions) for x in topk_proportions]
-        topic_list.append([(id2word[i], prop) for i, prop in zip(topk, topk_proportions)])
+    # H may be dense or a pruned CSR matrix
+    for topk, weights in top_k_per_topic(H, top_words):
+        # a pruned topic can be left without any weight
+        total = weights.sum()
+        topk_proportions = weights / (total if total > 0 else 1)
+        topic_list.append([(id2word[i], prop) for i, prop in zip(topk.tolist(), topk_proportions.tolist())])
     return topic_list
 
 # Function to parse command-line arguments
@@ -67,7 +35,30 @@ def parse_args():
     parser.add_argument('--W_max', type=float, default=1e-9, help="Max value for W")
     parser.add_argument('--theta_min', type=float, default=0.4, help="Min value for theta")
     parser.add_argument('--MH_indices', type=int, nargs='+', default=[0, 1, 2, 3, 4, 5, 6,7], help="List of Mental Health indices")
-    parser.add_argument('--max_iteration', type=float, default=40, help="maximum iteration of the training")
+    parser.add_argument('--min_df', type=int, default=1, help="Drop non-seed words occurring in fewer documents")
+    parser.add_argument('--max_df', type=float, default=1.0, help="Drop non-seed words occurring in more documents (proportion if < 1, else count)")
+    parser.add_argument('--max_features', type=int, default=None, help="Keep at most this many words (seed words always kept)")
+    parser.add_argument('--seed_groups', type=str, default=None, help="Optional JSON file mapping topic index to its own list of seed words (overrides MH_indices)")
+    parser.add_argument('--max_iteration', type=int, default=40, help="maximum iteration of the training")
+    parser.add_argument('--H_top_k', type=int, default=None, help="Keep only the top-k words per topic, the returned H is then sparse (CSR)")
+    parser.add_argument('--H_threshold', type=float, default=None, help="Keep only words holding at least this share of a topic's weight")
+    parser.add_argument('--dedup', type=str, default='none', choices=['none', 'exact', 'near'], help="Collapse duplicate documents into weighted rows before training")
+    parser.add_argument('--near_dup_threshold', type=float, default=0.8, help="Minimum estimated Jaccard similarity for --dedup near")
+    parser.add_argument('--n_topics_range', type=int, nargs='+', default=None, help="Select n_topics among these values (warm-started model-order search) before training")
+    parser.add_argument('--n_topics_criterion', type=str, default='elbow', choices=['elbow', 'heldout'], help="Selection rule of --n_topics_range: knee of the training KL curve, or lowest held-out document-completion KL")
+    parser.add_argument('--results_dir', type=str, default=None, help="Optional directory for structured results (topics, rankings, documents tables)")
+    parser.add_argument('--results_format', type=str, default='jsonl', choices=['jsonl', 'parquet'], help="Format of the structured results")
+    parser.add_argument('--no_text_report', action='store_true', help="Skip the text report at output_path")
+    parser.add_argument('--random_state', type=int, default=None, help="Seed for initialization (default: unseeded)")
+    parser.add_argument('--init', type=str, default='random', choices=['random', 'nndsvd', 'seeded'], help="Initialization of W and H")
+    parser.add_argument('--step_schedule', type=str, default='fixed', choices=['fixed', 'adaptive'], help="Step schedule of the Lagrange multipliers (fixed: constant eta=0.001; adaptive derives the g1 documents per topic)")
+    parser.add_argument('--memory_limit', type=str, default=None, help="Memory budget of training: bytes, with a K/M/G/T suffix, or 'container' for the cgroup limit")
+    parser.add_argument('--n_restarts', type=int, default=1, help="Fit this many times from independent seeds and keep the lowest KL")
+    parser.add_argument('--model_path', type=str, default=None, help="Optional path to save H and the fitted vectorizer (.npz) for serve.py")
+    parser.add_argument('--workers', type=int, default=None, help="Processes ranking document shards (default: CPU count)")
+    parser.add_argument('--shard_size', type=int, default=20000, help="Documents per ranking shard")
+    parser.add_argument('--n_top_docs', type=int, default=10, help="Documents reported per topic")
+    parser.add_argument('--index_path', type=str, default=None, help="Optional path to save a retrieval index (.npz) of top documents per topic and topics per document")
     # parser.add_argument('--param_name', type=int, default=some_value, help="Description of param_name")
     return parser.parse_args()
 
@@ -79,12 +70,6 @@ def main():
         raise FileNotFoundError(f"Input file {args.data_path} not found")
     data = pd.read_csv(args.data_path)
 
-    # Preprocessing or additional steps can be included here
-    # Example: vectorization using TF-IDF
-    tfidf_vectorizer = TfidfVectorizer()
-    tfidf_matrix = tfidf_vectorizer.fit_transform(data['Sentence'])  # Assuming your data has a 'text_column'
-    tfidf_feature_names = tfidf_vectorizer.get_feature_names_out()
-
     seed_words =[
         "terapeutti",
         "negatiivisuus",
@@ -211,34 +196,72 @@ def main():
         'burnout',
         'elämänhallinta',
         'erot']
-    seed_indices = [i for i, word in enumerate(tfidf_feature_names) if word in set(seed_words)]
-    non_seed_indices = [i for i in range(len(tfidf_feature_names)) if i not in seed_indices]
+    seed_groups = None
+    if args.seed_groups:
+        # per-topic seed words: {"0": ["masennus", ...], "3": [...]}
+        with open(args.seed_groups, encoding='utf-8') as f:
+            seed_groups = json.load(f)
+        seed_words = [word for words in seed_groups.values() for word in words]
+    # TF-IDF vectorization with df pruning that never drops seed words
+    max_df = args.max_df if args.max_df <= 1 else int(args.max_df)
+    tfidf_matrix, tfidf_vectorizer, seed_indices, non_seed_indices, missing_seed_words = build_vocabulary(
+        data['Sentence'], seed_words, min_df=args.min_df, max_df=max_df, max_features=args.max_features)
+    tfidf_feature_names = tfidf_vectorizer.get_feature_names_out()
+    print(f"Vocabulary size: {len(tfidf_feature_names)}, seed words in vocab: {len(seed_indices)}")
+    if missing_seed_words:
+        print(f"Seed words missing from the corpus: {', '.join(missing_seed_words)}")
+    if seed_groups is not None:
+        seed_indices, _ = seed_group_indices(tfidf_feature_names, seed_groups, tfidf_vectorizer.lowercase)
+        non_seed_indices = None
+    if args.step_schedule == 'adaptive':
+        # the adaptive steps only stay bounded with the per-topic g1 documents
+        non_seed_indices = None
+    if args.n_topics_range:
+        # same g1 documents as the final fit, so k is chosen under the constraints it is trained with
+        report, _ = select_n_topics(tfidf_matrix, args.n_topics_range, args.MH_indices, args.W_max, seed_indices,
+                                    args.theta_min, args.max_iteration, random_state=args.random_state, init=args.init,
+                                    zero_seed_indices=non_seed_indices)
+        report_path = os.path.splitext(args.output_path)[0] + '_n_topics.json'
+        with open(report_path, 'w') as file:
+            json.dump(report, file, indent=2)
+        args.n_topics = best_n_topics(report, args.n_topics_criterion)
+        print(f"Selected n_topics={args.n_topics}, report saved to {report_path}")
+    V, sample_weight, inverse = tfidf_matrix, None, None
+    if args.dedup != 'none':
+        V, sample_weight, inverse = deduplicate(tfidf_matrix, near_duplicates=args.dedup == 'near', threshold=args.near_dup_threshold)
+        print(f"Deduplicated {tfidf_matrix.shape[0]} documents into {V.shape[0]} weighted rows")
     # Model training
-    W, H = train(tfidf_matrix, args.n_topics, args.MH_indices, args.W_max, non_seed_indices, seed_indices, args.theta_min, args.max_iteration)
+    train_kwargs = dict(H_top_k=args.H_top_k, H_threshold=args.H_threshold, sample_weight=sample_weight, init=args.init,
+                        step_schedule=args.step_schedule, memory_limit=args.memory_limit)
+    if args.n_restarts > 1:
+        W, H, kl_losses = train_restarts(V, args.n_topics, args.MH_indices, args.W_max, non_seed_indices, seed_indices, args.theta_min,
+                                         n_restarts=args.n_restarts, random_state=args.random_state, max_iter=args.max_iteration, **train_kwargs)
+    else:
+        W, H, kl_losses = train(V, args.n_topics, args.MH_indices, args.W_max, non_seed_indices, seed_indices, args.theta_min, args.max_iteration,
+                                random_state=args.random_state, **train_kwargs)
+    if inverse is not None:
+        W = W[inverse]
+    if args.model_path:
+        save_model(args.model_path, H, tfidf_vectorizer)
+    if args.index_path:
+        TopicIndex.build(W, tfidf_matrix, H).save(args.index_path)
+        print(f"Retrieval index saved to {args.index_path}")
 
     result = {}
     result["topic-word-matrix"] = H
     id2word = {i: word for i, word in enumerate(tfidf_feature_names)}
     result["topics"] = get_topicsss(H, 10, id2word)
 
-    ranked_documents = rank_documents_by_custom_js(tfidf_matrix, W, H)
+    # top documents per topic by JS divergence, ranked shard by shard on worker processes
+    ranked_documents = rank_documents_sharded(tfidf_matrix, H, args.n_top_docs, args.shard_size, args.workers)
     # Save the output
-    with open(args.output_path, 'w') as file:
-        for topic_index in range(args.n_topics):
-            document_indices = ranked_documents[topic_index][:10]
-            file.write(f"Top 10 documents for Topic #{topic_index}:\n")
-            file.write(f"{document_indices}\n")
-
-            top_words = set(word for word, _ in result["topics"][topic_index])
-            for doc_index in document_indices:
-                highlighted_doc = highlight_top_words(data['Sentence'][doc_index], top_words)
-                file.write(f"Document #{doc_index}: {highlighted_doc}\n")
-        file.write("\nGenerated Topics and Associated Documents:\n")
-        for topic_idx, words in enumerate(result["topics"]):
-            topic_words = ' - '.join([f"{word}" for word, _ in words])
-            file.write(f"Topic #{topic_idx}: {topic_words}\n")
-
-    print(f"Results saved to {args.output_path}")
+    if args.results_dir:
+        write_structured_results(args.results_dir, result["topics"], ranked_documents, W, n_top_docs=args.n_top_docs,
+                                 fmt=args.results_format)
+        print(f"Structured results saved to {args.results_dir}")
+    if not args.no_text_report:
+        write_text_report(args.output_path, data['Sentence'], result["topics"], ranked_documents, n_top_docs=args.n_top_docs)
+        print(f"Results saved to {args.output_path}")
 
 if __name__ == "__main__":
     main()
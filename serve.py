@@ -0,0 +1,293 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from OurAlgorithm import _special_sparse_dot, fold_in, load_model, top_k_per_topic
+
+
+class TopicScorer:
+    """Scores raw documents against a trained H with the fitted vectorizer."""
+
+    def __init__(self, H, vectorizer, n_top_words=10, fold_in_iter=30):
+        self.H = H
+        self.vectorizer = vectorizer
+        self.fold_in_iter = fold_in_iter
+        self.feature_names = np.asarray(vectorizer.get_feature_names_out())
+        # topic top words never change, so extract them once at load time
+        self.topic_words = [self.feature_names[words].tolist() for words, _ in top_k_per_topic(H, n_top_words)]
+
+    def score(self, texts, n_top_topics=3, n_top_words=10):
+        V = self.vectorizer.transform(texts)
+        W = fold_in(V, self.H, max_iter=self.fold_in_iter)
+        # word contributions (WH restricted to the words present in each document)
+        WH = _special_sparse_dot(W, self.H, V)
+        W_sum = W.sum(axis=1, keepdims=True)
+        W_sum[W_sum == 0] = 1
+        theta = W / W_sum
+        top_topics = np.argsort(-theta, axis=1)[:, :n_top_topics]
+        results = []
+        for d in range(len(texts)):
+            row = slice(WH.indptr[d], WH.indptr[d + 1])
+            words, weights = WH.indices[row], WH.data[row]
+            order = np.argsort(-weights)[:n_top_words]
+            best = int(top_topics[d, 0])
+            results.append({
+                "topics": [(int(k), float(theta[d, k])) for k in top_topics[d]],
+                "topic_words": self.topic_words[best],
+                "doc_words": self.feature_names[words[order]].tolist(),
+            })
+        return results
+
+
+class Stats:
+    """Latency/throughput counters over a sliding window of requests, kept in shared memory
+    so that every forked worker records into (and /stats reports) the same totals."""
+
+    _REQUESTS, _DOCS, _BATCHES, _ERRORS, _RECORDED = range(5)
+
+    def __init__(self, window=10000, workers=1):
+        # created before forking, the lock and arrays are inherited by every worker
+        self.lock = multiprocessing.Lock()
+        self.started = time.time()
+        self.workers = workers
+        self.latencies = multiprocessing.RawArray("d", window)
+        self.counters = multiprocessing.RawArray("q", 5)
+
+    def record_batch(self, n_docs, latencies):
+        with self.lock:
+            self.counters[self._BATCHES] += 1
+            self.counters[self._REQUESTS] += len(latencies)
+            self.counters[self._DOCS] += n_docs
+            position = self.counters[self._RECORDED]
+            for latency in latencies:
+                self.latencies[position % len(self.latencies)] = latency
+                position += 1
+            self.counters[self._RECORDED] = position
+
+    def record_error(self):
+        with self.lock:
+            self.counters[self._ERRORS] += 1
+
+    def snapshot(self):
+        with self.lock:
+            requests, docs, batches, errors, recorded = self.counters[:]
+            latencies = np.array(self.latencies[:min(recorded, len(self.latencies))]) * 1000.0
+        uptime = time.time() - self.started
+        snapshot = {
+            "pid": os.getpid(),
+            "workers": self.workers,
+            "uptime_s": uptime,
+            "requests": requests,
+            "docs": docs,
+            "batches": batches,
+            "errors": errors,
+            "mean_batch_size": docs / batches if batches else 0.0,
+            "docs_per_s": docs / uptime if uptime > 0 else 0.0,
+        }
+        if latencies.size:
+            snapshot["p50_ms"], snapshot["p99_ms"] = np.percentile(latencies, [50, 99]).tolist()
+        return snapshot
+
+
+class _Pending:
+    __slots__ = ("texts", "submitted", "done", "result", "error")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests so fold-in and top-k extraction run once per batch."""
+
+    def __init__(self, scorer, max_batch=256, max_wait_ms=2.0, stats=None):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = stats if stats is not None else Stats()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, texts):
+        pending = _Pending(texts)
+        self.queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        n_docs = len(batch[0].texts)
+        deadline = time.perf_counter() + self.max_wait
+        while n_docs < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            n_docs += len(pending.texts)
+        return batch, n_docs
+
+    def _run(self):
+        while True:
+            batch, n_docs = self._collect()
+            texts = [text for pending in batch for text in pending.texts]
+            try:
+                results = self.scorer.score(texts)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+                    pending.done.set()
+                self.stats.record_error()
+                continue
+            start = 0
+            now = time.perf_counter()
+            for pending in batch:
+                pending.result = results[start:start + len(pending.texts)]
+                start += len(pending.texts)
+                pending.done.set()
+            self.stats.record_batch(n_docs, [now - pending.submitted for pending in batch])
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without TCP_NODELAY keep-alive
+    # responses stall on the client's delayed ACK (~40 ms per request)
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.server.batcher.stats.snapshot())
+        elif self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length))
+            if not isinstance(request, dict):
+                raise TypeError("the request body must be a JSON object")
+            texts = request["texts"] if "texts" in request else [request["text"]]
+            if not isinstance(texts, list):
+                # a bare string would be scored as one document per character
+                raise TypeError(f"'texts' must be a list, got {type(texts).__name__}")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"bad request: {e}"})
+            return
+        try:
+            results = self.server.batcher.submit([str(text) for text in texts])
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"results": results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        # unix sockets have no peer address, BaseHTTPRequestHandler expects a tuple
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def make_server(host, port, unix_socket=None):
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        return ThreadingUnixHTTPServer(unix_socket, ScoringHandler)
+    ThreadingHTTPServer.allow_reuse_address = True
+    return ThreadingHTTPServer((host, port), ScoringHandler)
+
+
+def serve(server, scorer, max_batch, max_wait_ms, stats=None):
+    # the batcher thread is started per process, after any fork
+    server.batcher = MicroBatcher(scorer, max_batch=max_batch, max_wait_ms=max_wait_ms, stats=stats)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local batched topic scoring service")
+    parser.add_argument('--model_path', type=str, required=True, help="Model file written by script-run.py --model_path")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Host to bind")
+    parser.add_argument('--port', type=int, default=8080, help="Port to bind")
+    parser.add_argument('--unix_socket', type=str, default=None, help="Serve on a unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=1, help="Number of worker processes sharing the loaded model")
+    parser.add_argument('--max_batch', type=int, default=256, help="Maximum number of documents per micro-batch")
+    parser.add_argument('--max_wait_ms', type=float, default=2.0, help="Maximum time to wait for a micro-batch to fill")
+    parser.add_argument('--fold_in_iter', type=int, default=30, help="Iterations of the fold-in W solve")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # load once in the parent; forked workers share the pages copy-on-write
+    H, vectorizer = load_model(args.model_path)
+    scorer = TopicScorer(H, vectorizer, fold_in_iter=args.fold_in_iter)
+    server = make_server(args.host, args.port, args.unix_socket)
+    stats = Stats(workers=args.workers)
+    children = []
+    for _ in range(args.workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            serve(server, scorer, args.max_batch, args.max_wait_ms, stats)
+            os._exit(0)
+        children.append(pid)
+    # serve_forever runs on the main thread, so shutdown() has to come from another one
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start())
+    address = args.unix_socket or f"{args.host}:{args.port}"
+    print(f"Serving {args.model_path} on {address} with {args.workers} worker(s)")
+    try:
+        serve(server, scorer, args.max_batch, args.max_wait_ms, stats)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in children:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from OurAlgorithm import heldout_kl, train
+from vocabulary import build_vocabulary
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "synthetic-data.csv")
+
+
+@pytest.fixture(scope="module")
+def model():
+    data = pd.read_csv(DATA_PATH)
+    V, _, seed_indices, _, _ = build_vocabulary(data["Sentence"], ["masennus", "terapia"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, H, _ = train(V[:400], 8, [0], 1e-9, None, seed_indices, 0.4, 20, random_state=0)
+    return V[400:], H
+
+
+@pytest.mark.parametrize("completion_fraction", [None, 0.5])
+def test_heldout_kl_does_not_depend_on_chunk_size(model, completion_fraction):
+    V, H = model
+    scores = [heldout_kl(V, H, chunk_size=chunk_size, completion_fraction=completion_fraction)
+              for chunk_size in (7, 33, V.shape[0])]
+    np.testing.assert_allclose(scores, scores[-1], rtol=1e-12)
@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+
+from model_selection import best_n_topics, elbow_index, select_n_topics
+from vocabulary import build_vocabulary
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "synthetic-data.csv")
+SEED_WORDS = ["masennus", "ahdistus", "terapia", "psykoosi", "väkivalta", "suru", "trauma", "apua", "tukea"]
+
+
+def test_elbow_index_uses_the_k_spacing():
+    assert elbow_index([2, 3, 4, 5, 6], [10.0, 4.0, 3.0, 2.5, 2.0]) == 1
+    # evenly indexed the knee would be k=3; on the k axis the flat part starts at k=4
+    assert elbow_index([2, 3, 4, 20], [10.0, 5.0, 4.0, 3.5]) == 2
+    assert elbow_index([2, 3], [10.0, 4.0]) == 0
+
+
+def test_selection_picks_an_interior_k_on_the_sample_corpus():
+    data = pd.read_csv(DATA_PATH)
+    V, _, seed_indices, non_seed_indices, _ = build_vocabulary(data["Sentence"], SEED_WORDS)
+    report, _ = select_n_topics(V, range(3, 10), [0, 1, 2], 1e-9, seed_indices, 0.4, 40, random_state=0,
+                                zero_seed_indices=non_seed_indices, verbose=False)
+    assert "g1_violation" not in report[0]
+    assert 3 < best_n_topics(report) < 9
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from OurAlgorithm import train
+from vocabulary import build_vocabulary
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "synthetic-data.csv")
+SEED_WORDS = ["masennus", "ahdistus", "terapia", "psykoosi", "väkivalta", "suru", "trauma", "apua", "tukea"]
+MH_INDICES = [0, 1, 2, 3]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    data = pd.read_csv(DATA_PATH)
+    V, _, seed_indices, non_seed_indices, _ = build_vocabulary(data["Sentence"], SEED_WORDS)
+    return V, seed_indices, non_seed_indices
+
+
+def _fit(V, zero_seed_indices, seed_indices, step_schedule):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return train(V, 8, MH_INDICES, 1e-9, zero_seed_indices, seed_indices, 0.4, 30, random_state=0,
+                     step_schedule=step_schedule)
+
+
+def test_adaptive_keeps_H_scale_of_fixed(corpus):
+    V, seed_indices, _ = corpus
+    _, H_fixed, kl_fixed = _fit(V, None, seed_indices, "fixed")
+    _, H_adaptive, kl_adaptive = _fit(V, None, seed_indices, "adaptive")
+    assert np.all(np.isfinite(H_adaptive))
+    ratio = H_adaptive.sum(axis=1) / H_fixed.sum(axis=1)
+    # guided rows may grow a little to carry their seed share, never by orders of magnitude
+    assert ratio[MH_INDICES].max() < 10
+    np.testing.assert_allclose(np.delete(ratio, MH_INDICES), 1, rtol=0.1)
+    assert kl_adaptive[-1] < 1.1 * kl_fixed[-1]
+
+
+def test_adaptive_rejects_legacy_zero_seed_indices(corpus):
+    V, seed_indices, non_seed_indices = corpus
+    with pytest.raises(ValueError, match="adaptive"):
+        _fit(V, non_seed_indices, seed_indices, "adaptive")
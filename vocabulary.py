@@ -0,0 +1,78 @@
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+
+def seed_index_arrays(feature_names, seed_words, lowercase=True):
+    """Seed and non-seed vocabulary index arrays through a word -> index hash, in O(V + S).
+
+    Returns (seed_indices, non_seed_indices, missing_seed_words); seed words are lowercased
+    like the vectorizer's tokens when `lowercase` is set.
+    """
+    word2id = {word: i for i, word in enumerate(feature_names)}
+    seed_words = dict.fromkeys(word.lower() if lowercase else word for word in seed_words)
+    missing_seed_words = [word for word in seed_words if word not in word2id]
+    seed_indices = np.array(sorted(word2id[word] for word in seed_words if word in word2id), dtype=int)
+    is_seed = np.zeros(len(word2id), dtype=bool)
+    is_seed[seed_indices] = True
+    return seed_indices, np.flatnonzero(~is_seed), missing_seed_words
+
+
+def seed_group_indices(feature_names, seed_groups, lowercase=True):
+    """Per-topic seed index arrays for a mapping topic -> seed words, each group mapped (and
+    lowercased) by seed_index_arrays. Returns ({topic: seed_indices}, missing_seed_words)."""
+    groups, missing_seed_words = {}, {}
+    for topic, words in seed_groups.items():
+        groups[int(topic)], _, missing = seed_index_arrays(feature_names, words, lowercase)
+        missing_seed_words.update(dict.fromkeys(missing))
+    return groups, list(missing_seed_words)
+
+
+def _df_bound(value, n_docs):
+    # sklearn convention: floats are proportions of documents, ints are absolute counts
+    return value * n_docs if isinstance(value, float) else value
+
+
+def build_vocabulary(documents, seed_words, min_df=1, max_df=1.0, max_features=None, **vectorizer_params):
+    """TF-IDF matrix with min_df/max_df/max_features pruning that always keeps seed words.
+
+    Documents are tokenized once; pruning and TF-IDF weighting are done on the count matrix.
+    Returns (tfidf_matrix, vectorizer, seed_indices, non_seed_indices, missing_seed_words),
+    where vectorizer is a fitted TfidfVectorizer over the pruned vocabulary.
+    """
+    count_params = {key: value for key, value in vectorizer_params.items()
+                    if key not in ('norm', 'use_idf', 'smooth_idf', 'sublinear_tf')}
+    count_vectorizer = CountVectorizer(**count_params)
+    counts = count_vectorizer.fit_transform(documents).tocsc()
+    terms = count_vectorizer.get_feature_names_out()
+    lowercase = count_vectorizer.lowercase
+    seed_indices, _, missing_seed_words = seed_index_arrays(terms, seed_words, lowercase)
+
+    n_docs = counts.shape[0]
+    df = np.diff(counts.indptr)
+    is_seed = np.zeros(len(terms), dtype=bool)
+    is_seed[seed_indices] = True
+    keep = (df >= _df_bound(min_df, n_docs)) & (df <= _df_bound(max_df, n_docs)) & ~is_seed
+    if max_features is not None:
+        budget = max(max_features - len(seed_indices), 0)
+        if keep.sum() > budget:
+            term_freq = np.asarray(counts.sum(axis=0)).ravel()
+            candidates = np.flatnonzero(keep)
+            top = candidates[np.argsort(-term_freq[candidates], kind='stable')[:budget]]
+            keep[:] = False
+            keep[top] = True
+    keep |= is_seed
+    kept = np.flatnonzero(keep)
+
+    transformer = TfidfTransformer(**{key: value for key, value in vectorizer_params.items()
+                                      if key in ('norm', 'use_idf', 'smooth_idf', 'sublinear_tf')})
+    tfidf_matrix = transformer.fit_transform(counts[:, kept].tocsr())
+    vectorizer = TfidfVectorizer(**vectorizer_params)
+    vectorizer.vocabulary_ = {word: i for i, word in enumerate(terms[kept].tolist())}
+    if transformer.use_idf:
+        vectorizer.idf_ = transformer.idf_
+
+    # kept is sorted, so old seed positions map to new ones by binary search
+    seed_indices = np.searchsorted(kept, seed_indices)
+    is_seed = np.zeros(len(kept), dtype=bool)
+    is_seed[seed_indices] = True
+    return tfidf_matrix, vectorizer, seed_indices, np.flatnonzero(~is_seed), missing_seed_words